@@ -0,0 +1,44 @@
+# actions.py
+# Cart and favorites writes. Each one is a single indexed statement and
+# returns the new state of the item, so the front end can update in place.
+# Callers own the transaction.
+
+
+def add_to_cart(db, user_id, book_id):
+    cursor = db.execute("""
+        INSERT INTO cart (user_id, book_id, quantity) VALUES (?, ?, 1)
+        ON CONFLICT (user_id, book_id) DO UPDATE SET quantity = quantity + 1
+        RETURNING quantity
+    """, (user_id, book_id))
+    rows = cursor.fetchall()
+    return {'book_id': book_id, 'quantity': rows[0][0], 'changed': cursor.rowcount > 0}
+
+
+def remove_from_cart(db, user_id, book_id):
+    cursor = db.execute("DELETE FROM cart WHERE user_id = ? AND book_id = ?", (user_id, book_id))
+    return {'book_id': book_id, 'quantity': 0, 'changed': cursor.rowcount > 0}
+
+
+def add_to_favorites(db, user_id, book_id):
+    cursor = db.execute("""
+        INSERT INTO favorites (user_id, book_id) VALUES (?, ?)
+        ON CONFLICT (user_id, book_id) DO NOTHING
+    """, (user_id, book_id))
+    return {'book_id': book_id, 'favorited': True, 'changed': cursor.rowcount > 0}
+
+
+def remove_from_favorites(db, user_id, book_id):
+    cursor = db.execute("DELETE FROM favorites WHERE user_id = ? AND book_id = ?", (user_id, book_id))
+    return {'book_id': book_id, 'favorited': False, 'changed': cursor.rowcount > 0}
+
+
+BATCH_OPERATIONS = {
+    'add_to_cart': add_to_cart,
+    'remove_from_cart': remove_from_cart,
+    'add_to_favorites': add_to_favorites,
+    'remove_from_favorites': remove_from_favorites,
+}
+
+FAVORITES_OPERATIONS = {'add_to_favorites', 'remove_from_favorites'}
+
+MAX_BATCH_OPERATIONS = 50
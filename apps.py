@@ -1,13 +1,41 @@
 # apps.py
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-from database import get_database, close_database, init_db
-from werkzeug.security import generate_password_hash, check_password_hash
+import hmac
+import os
+import sqlite3
+import uuid
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, make_response
+from database import get_database, close_database, write_transaction, DEFAULT_DATABASE
+from catalog import (get_catalog, get_catalog_html, get_catalog_version, get_category,
+                     category_books, DEFAULT_PREVIEW_SIZE, MAX_PAGE_SIZE)
+from search import search_books, InvalidCursor, DEFAULT_LIMIT
+from money import format_price
+import actions
+import assets
+import bookio
+import jinjacache
+import metrics
+import migrations
+import sales
+from userstats import UserStats, get_user_stats, get_favorite_ids, invalidate_favorites
+from pagecache import conditional_page
+from auth import hash_password, verify_password, needs_rehash, dummy_hash, get_throttle, HashingBusy
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your_very_strong_secret_key_change_this_now!'
-
-# Initialize DB (creates tables if needed)
-init_db(app)
+app.config['DATABASE'] = os.environ.get('PAGEAPI_DATABASE', DEFAULT_DATABASE)
+# Log statements slower than this many milliseconds with their query plan (unset disables)
+app.config['SLOW_QUERY_MS'] = float(os.environ['PAGEAPI_SLOW_QUERY_MS']) if 'PAGEAPI_SLOW_QUERY_MS' in os.environ else None
+# Sales reports beyond best sellers need this token in X-Reports-Token (unset disables them)
+app.config['REPORTS_TOKEN'] = os.environ.get('PAGEAPI_REPORTS_TOKEN')
+# Bearer token scrapers must send to read /metrics (unset disables it)
+app.config['METRICS_TOKEN'] = os.environ.get('PAGEAPI_METRICS_TOKEN')
+app.add_template_filter(format_price, 'money')
+assets.init_app(app)
+bookio.init_app(app)
+metrics.init_app(app)
+migrations.init_app(app)
+sales.init_app(app)
+jinjacache.init_app(app)
 
 @app.teardown_appcontext
 def teardown_db(exception):
@@ -19,63 +47,88 @@ def get_user_id():
 @app.route('/')
 def index():
     db = get_database()
-    cursor = db.cursor()
-
-    # Load books from DB
-    cursor.execute("""
-        SELECT category, 
-               GROUP_CONCAT(id || '|' || title || '|' || img || '|' || price, ',') AS book_data
-        FROM books 
-        GROUP BY category
-    """)
-    rows = cursor.fetchall()
-
-    books = {}
-    nav_categories = []
-
-    for row in rows:
-        category = row['category']
-        book_strings = row['book_data'].split(',')
-
-        book_list = []
-        for b in book_strings:
-            parts = b.split('|')
-            if len(parts) == 4:
-                book_id, title, img, price = parts
-                book_list.append({"id": int(book_id), "title": title, "img": img, "price": price})
-
-        books[category] = book_list
-        nav_categories.append((
-            category.lower().replace(' ', '-'),
-            category.split()[0],
-            category
-        ))
+
+    # Catalog comes from the in-process snapshot; rebuilt only when books change
+    catalog = get_catalog(db)
 
     user_id = get_user_id()
+    # Header badges come from maintained counters, hearts from the cached set
+    stats = get_user_stats(db, user_id) if user_id else UserStats()
+
+    def render():
+        favorite_ids = frozenset()
+        if stats.favorites_count:
+            favorite_ids = get_favorite_ids(db, user_id, stats.favorites_version)
+
+        return render_template(
+            'index.html',
+            catalog_html=get_catalog_html(catalog),
+            nav_categories=catalog.nav_categories,
+            cart_count=stats.cart_count,
+            favorites_count=stats.favorites_count,
+            favorite_ids=favorite_ids
+        )
+
+    return conditional_page(
+        ('index', catalog.version, user_id, stats.cart_version, stats.favorites_version),
+        max(catalog.updated_at, stats.updated_at),
+        render
+    )
 
-    cart_count = 0
-    favorites_count = 0
-    favorite_ids = []
+def book_json(row):
+    return {
+        'id': row['id'],
+        'title': row['title'],
+        'img': assets.static_url('images/' + row['img']),
+        'price': format_price(row['price_cents']),
+        'price_cents': row['price_cents'],
+    }
+
+# === CATEGORIES ===
+@app.route('/api/categories/<slug>/books')
+def api_category_books(slug):
+    after = request.args.get('after', 0, type=int)
+    limit = max(1, min(request.args.get('limit', DEFAULT_PREVIEW_SIZE, type=int), MAX_PAGE_SIZE))
 
-    if user_id:
-        # Cart count
-        cursor.execute("SELECT SUM(quantity) FROM cart WHERE user_id = ?", (user_id,))
-        row = cursor.fetchone()
-        cart_count = row[0] or 0
-
-        # Favorites
-        cursor.execute("SELECT book_id FROM favorites WHERE user_id = ?", (user_id,))
-        favorite_ids = [row['book_id'] for row in cursor.fetchall()]
-        favorites_count = len(favorite_ids)
-
-    return render_template(
-        'index.html',
-        books=books,
-        nav_categories=nav_categories,
-        cart_count=cart_count,
-        favorites_count=favorites_count,
-        favorite_ids=favorite_ids
-    )
+    db = get_database()
+    category = get_category(db, slug)
+    if category is None:
+        return jsonify({'success': False, 'message': 'Kategoria nuk ekziston!'}), 404
+
+    rows, next_after = category_books(db, category['id'], after, limit)
+    return jsonify({
+        'category': {'name': category['name'], 'slug': category['slug']},
+        'books': [book_json(row) for row in rows],
+        'next_after': next_after,
+    })
+
+# === SEARCH ===
+@app.route('/api/search')
+def api_search():
+    query = request.args.get('q', '').strip()
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    cursor = request.args.get('cursor')
+
+    try:
+        rows, next_cursor = search_books(get_database(), query, limit, cursor)
+    except InvalidCursor:
+        return jsonify({'success': False, 'message': 'Kursor i pavlefshëm!'}), 400
+
+    results = [dict(book_json(row), category=row['category']) for row in rows]
+    return jsonify({'results': results, 'next_cursor': next_cursor})
+
+# === AUTH HELPERS ===
+def auth_rejected(template, status, retry_after, message):
+    flash(message, 'error')
+    response = make_response(render_template(template), status)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def throttled(template, retry_after):
+    return auth_rejected(template, 429, retry_after, 'Shumë përpjekje! Provo përsëri pas pak.')
+
+def hashing_busy(template):
+    return auth_rejected(template, 503, 5, 'Shërbimi është i ngarkuar. Provo përsëri pas pak.')
 
 # === SIGNUP ===
 @app.route('/signup', methods=['GET', 'POST'])
@@ -86,22 +139,35 @@ def signup():
         email = request.form['email'].lower()
         password = request.form['password']
 
+        # Throttle before doing any hashing work
+        ip_throttle = get_throttle('SIGNUP_IP_LIMIT')
+        retry_after = ip_throttle.retry_after(request.remote_addr)
+        if retry_after:
+            return throttled('sign.html', retry_after)
+        ip_throttle.hit(request.remote_addr)
+
         db = get_database()
         cursor = db.cursor()
 
         cursor.execute("SELECT id FROM users WHERE email = ?", (email,))
         if cursor.fetchone():
             flash('Ky email është tashmë i regjistruar!', 'error')
-            db.close()
             return redirect(url_for('signup'))
 
-        hashed = generate_password_hash(password)
-        cursor.execute("""
-            INSERT INTO users (name, surname, email, password_hash)
-            VALUES (?, ?, ?, ?)
-        """, (name, surname, email, hashed))
+        try:
+            hashed = hash_password(password)
+        except HashingBusy:
+            return hashing_busy('sign.html')
+
+        try:
+            cursor.execute("""
+                INSERT INTO users (name, surname, email, password_hash)
+                VALUES (?, ?, ?, ?)
+            """, (name, surname, email, hashed))
+        except sqlite3.IntegrityError:
+            flash('Ky email është tashmë i regjistruar!', 'error')
+            return redirect(url_for('signup'))
         db.commit()
-        db.close()
 
         flash('Llogaria u krijua me sukses! Tani mund të kyçesh.', 'success')
         return redirect(url_for('login'))
@@ -115,18 +181,51 @@ def login():
         email = request.form['email'].lower()
         password = request.form['password']
 
+        # Per-IP attempts and per-account failures are checked before any
+        # hashing. Failures are counted per (account, IP), so nobody can lock
+        # a real user out by failing logins with their email.
+        ip_throttle = get_throttle('LOGIN_IP_LIMIT')
+        account_throttle = get_throttle('LOGIN_ACCOUNT_LIMIT')
+        account_key = (email, request.remote_addr)
+        retry_after = max(ip_throttle.retry_after(request.remote_addr),
+                          account_throttle.retry_after(account_key))
+        if retry_after:
+            return throttled('login.html', retry_after)
+        ip_throttle.hit(request.remote_addr)
+
         db = get_database()
         cursor = db.cursor()
         cursor.execute("SELECT id, password_hash FROM users WHERE email = ?", (email,))
         user = cursor.fetchone()
-        db.close()
 
-        if user and check_password_hash(user['password_hash'], password):
+        # Unknown emails are checked against a dummy hash so the response
+        # time doesn't tell which emails have accounts
+        try:
+            if user is None:
+                verify_password(dummy_hash(), password)
+                valid = False
+            else:
+                valid = verify_password(user['password_hash'], password)
+        except HashingBusy:
+            return hashing_busy('login.html')
+
+        if valid:
+            account_throttle.reset(account_key)
+            # Upgrade hashes made with older cost parameters; best effort
+            try:
+                if needs_rehash(user['password_hash']):
+                    db.execute("UPDATE users SET password_hash = ? WHERE id = ?",
+                               (hash_password(password), user['id']))
+                    db.commit()
+            except HashingBusy:
+                pass
+
             session['user_id'] = user['id']
             session['user_email'] = email
             flash('Ke hyrë me sukses!', 'success')
             return redirect(url_for('index'))
         else:
+            account_throttle.hit(account_key)
             flash('Email ose fjalëkalim i gabuar!', 'error')
 
     return render_template('login.html')  # Your existing login page
@@ -139,29 +238,35 @@ def logout():
     return redirect(url_for('index'))
 
 # === CART ===
+def user_counters(db, user_id):
+    stats = get_user_stats(db, user_id)
+    return {'cart_count': stats.cart_count, 'favorites_count': stats.favorites_count}
+
+def parse_book_id(data):
+    try:
+        return int(data['book_id'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
 @app.route('/add_to_cart', methods=['POST'])
 def add_to_cart():
     user_id = get_user_id()
     if not user_id:
         return jsonify({'success': False, 'message': 'Duhet të kyçesh së pari!'})
 
-    data = request.get_json()
-    book_id = data['book_id']
+    book_id = parse_book_id(request.get_json(silent=True))
+    if book_id is None:
+        return jsonify({'success': False, 'message': 'Libri nuk ekziston!'}), 400
 
     db = get_database()
-    cursor = db.cursor()
-
-    cursor.execute("SELECT id FROM cart WHERE user_id = ? AND book_id = ?", (user_id, book_id))
-    existing = cursor.fetchone()
-
-    if existing:
-        cursor.execute("UPDATE cart SET quantity = quantity + 1 WHERE id = ?", (existing['id'],))
-    else:
-        cursor.execute("INSERT INTO cart (user_id, book_id, quantity) VALUES (?, ?, 1)", (user_id, book_id))
+    try:
+        with write_transaction(db):
+            result = actions.add_to_cart(db, user_id, book_id)
+    except sqlite3.IntegrityError:
+        return jsonify({'success': False, 'message': 'Libri nuk ekziston!'})
 
-    db.commit()
-    db.close()
-    return jsonify({'success': True, 'message': 'Shtuar në shportë!'})
+    return jsonify({'success': True, 'message': 'Shtuar në shportë!',
+                    **result, **user_counters(db, user_id)})
 
 @app.route('/cart')
 def cart():
@@ -171,29 +276,44 @@ def cart():
         return redirect(url_for('login'))
 
     db = get_database()
-    cursor = db.cursor()
+    catalog_version, catalog_updated_at = get_catalog_version(db)
+    stats = get_user_stats(db, user_id)
 
-    cursor.execute("""
-        SELECT c.quantity, b.id, b.title, b.img, b.price
-        FROM cart c
-        JOIN books b ON c.book_id = b.id
-        WHERE c.user_id = ?
-    """, (user_id,))
-    items = cursor.fetchall()
+    def render():
+        cursor = db.cursor()
 
-    total = sum(float(item['price'].replace('$', '')) * item['quantity'] for item in items)
-    db.close()
+        cursor.execute("""
+            SELECT c.quantity, b.id, b.title, b.img, b.price_cents
+            FROM cart c
+            JOIN books b ON c.book_id = b.id
+            WHERE c.user_id = ?
+        """, (user_id,))
+        items = cursor.fetchall()
 
-    return render_template('cart.html', cart_items=items, total_price=f"{total:.2f}$")
+        cursor.execute("""
+            SELECT SUM(b.price_cents * c.quantity)
+            FROM cart c
+            JOIN books b ON c.book_id = b.id
+            WHERE c.user_id = ?
+        """, (user_id,))
+        total_cents = cursor.fetchone()[0] or 0
+
+        return render_template('cart.html', cart_items=items, total_cents=total_cents,
+                               idempotency_key=uuid.uuid4().hex)
+
+    return conditional_page(
+        ('cart', catalog_version, user_id, stats.cart_version),
+        max(catalog_updated_at, stats.updated_at),
+        render
+    )
 
 @app.route('/remove_from_cart/<int:book_id>')
 def remove_from_cart(book_id):
     user_id = get_user_id()
     if user_id:
         db = get_database()
-        db.execute("DELETE FROM cart WHERE user_id = ? AND book_id = ?", (user_id, book_id))
-        db.commit()
-        db.close()
+        with write_transaction(db):
+            actions.remove_from_cart(db, user_id, book_id)
     return redirect(url_for('cart'))
 
 @app.route('/clear_cart')
@@ -203,7 +323,6 @@ def clear_cart():
         db = get_database()
         db.execute("DELETE FROM cart WHERE user_id = ?", (user_id,))
         db.commit()
-        db.close()
     return redirect(url_for('cart'))
 
 @app.route('/place_order', methods=['POST'])
@@ -213,48 +332,104 @@ def place_order():
         flash('Duhet të kyçesh për të porositur!', 'error')
         return redirect(url_for('login'))
 
-    db = get_database()
-    cursor = db.cursor()
-
-    # Get current cart items
-    cursor.execute("""
-        SELECT b.id, b.title, b.price, c.quantity 
-        FROM cart c 
-        JOIN books b ON c.book_id = b.id 
-        WHERE c.user_id = ?
-    """, (user_id,))
-    items = cursor.fetchall()
-
-    if not items:
-        flash('Shporta është bosh!', 'error')
-        db.close()
-        return redirect(url_for('cart'))
-
-    # Calculate total
-    total = sum(float(item['price'].replace('$', '')) * item['quantity'] for item in items)
-    total_str = f"{total:.2f}$"
-
-    # Create order
-    cursor.execute("INSERT INTO orders (user_id, total_price) VALUES (?, ?)", (user_id, total_str))
-    order_id = cursor.lastrowid
-
-    # Add items to order_items
-    for item in items:
-        price_per_book = item['price']
-        cursor.execute("""
-            INSERT INTO order_items (order_id, book_id, quantity, price)
-            VALUES (?, ?, ?, ?)
-        """, (order_id, item['id'], item['quantity'], price_per_book))
-
-    # Clear cart
-    cursor.execute("DELETE FROM cart WHERE user_id = ?", (user_id,))
+    # Browsers resend the key from the cart form on retry; API clients can
+    # send it as an Idempotency-Key header
+    idempotency_key = (request.headers.get('Idempotency-Key')
+                       or request.form.get('idempotency_key') or None)
 
-    db.commit()
-    db.close()
+    db = get_database()
+    with write_transaction(db):
+        existing = None
+        if idempotency_key:
+            existing = db.execute(
+                "SELECT id FROM orders WHERE user_id = ? AND idempotency_key = ?",
+                (user_id, idempotency_key)
+            ).fetchone()
+
+        if existing is None:
+            # Create the order with its total computed from the cart in one pass
+            cursor = db.execute("""
+                INSERT INTO orders (user_id, total_cents, idempotency_key)
+                SELECT ?, total, ?
+                FROM (
+                    SELECT SUM(b.price_cents * c.quantity) AS total
+                    FROM cart c
+                    JOIN books b ON c.book_id = b.id
+                    WHERE c.user_id = ?
+                )
+                WHERE total IS NOT NULL
+            """, (user_id, idempotency_key, user_id))
+
+            if cursor.rowcount == 0:
+                flash('Shporta është bosh!', 'error')
+                return redirect(url_for('cart'))
+            order_id = cursor.lastrowid
+
+            db.execute("""
+                INSERT INTO order_items (order_id, book_id, quantity, price_cents)
+                SELECT ?, c.book_id, c.quantity, b.price_cents
+                FROM cart c
+                JOIN books b ON c.book_id = b.id
+                WHERE c.user_id = ?
+            """, (order_id, user_id))
+            sales.record_order(db, order_id)
+
+            db.execute("DELETE FROM cart WHERE user_id = ?", (user_id,))
 
     flash('Porosia u krye me sukses! Faleminderit për blerjen ❤️', 'success')
     return redirect(url_for('index'))
 
+# === ORDER HISTORY ===
+@app.route('/api/orders')
+def api_orders():
+    user_id = get_user_id()
+    if not user_id:
+        return jsonify({'success': False, 'message': 'Duhet të kyçesh së pari!'}), 401
+
+    before = request.args.get('before', type=int)
+    limit = max(1, min(request.args.get('limit', sales.DEFAULT_HISTORY_LIMIT, type=int), sales.MAX_HISTORY_LIMIT))
+    history, next_before = sales.order_history(get_database(), user_id, before, limit)
+
+    orders = [{
+        'id': order['id'],
+        'order_date': order['order_date'],
+        'status': order['status'],
+        'total': format_price(order['total_cents']),
+        'total_cents': order['total_cents'],
+        'items': [dict(book_json(dict(item, id=item['book_id'])), quantity=item['quantity']) for item in items],
+    } for order, items in history]
+    return jsonify({'orders': orders, 'next_before': next_before})
+
+# === REPORTS ===
+def report_days():
+    days = request.args.get('days', type=int)
+    return max(1, days) if days is not None else None
+
+def sales_json(row):
+    return {
+        'quantity': row['quantity'],
+        'revenue': format_price(row['revenue_cents']),
+        'revenue_cents': row['revenue_cents'],
+        'orders': row['order_count'],
+    }
+
+@app.route('/api/reports/best-sellers')
+def api_best_sellers():
+    limit = max(1, min(request.args.get('limit', sales.DEFAULT_REPORT_LIMIT, type=int), sales.MAX_REPORT_LIMIT))
+    rows = sales.best_sellers(get_database(), limit, report_days())
+    books = [dict(book_json(row), category=row['category'], quantity=row['quantity']) for row in rows]
+    return jsonify({'books': books})
+
+@app.route('/api/reports/category-revenue')
+def api_category_revenue():
+    token = app.config.get('REPORTS_TOKEN')
+    if not token or not hmac.compare_digest(request.headers.get('X-Reports-Token', ''), token):
+        return jsonify({'success': False, 'message': 'Nuk ke qasje!'}), 403
+
+    rows = sales.category_revenue(get_database(), report_days())
+    categories = [dict(sales_json(row), category=row['name'], slug=row['slug']) for row in rows]
+    return jsonify({'categories': categories})
+
 # === FAVORITES ===
 @app.route('/add_to_favorites', methods=['POST'])
 def add_to_favorites():
@@ -262,21 +437,24 @@ def add_to_favorites():
     if not user_id:
         return jsonify({'success': False, 'message': 'Duhet të kyçesh së pari!'})
 
-    data = request.get_json()
-    book_id = data['book_id']
+    book_id = parse_book_id(request.get_json(silent=True))
+    if book_id is None:
+        return jsonify({'success': False, 'message': 'Libri nuk ekziston!'}), 400
 
     db = get_database()
-    cursor = db.cursor()
+    try:
+        with write_transaction(db):
+            result = actions.add_to_favorites(db, user_id, book_id)
+    except sqlite3.IntegrityError:
+        return jsonify({'success': False, 'message': 'Libri nuk ekziston!'})
 
-    cursor.execute("SELECT id FROM favorites WHERE user_id = ? AND book_id = ?", (user_id, book_id))
-    if cursor.fetchone():
-        db.close()
-        return jsonify({'success': False, 'message': 'Tashmë në të preferuara!'})
+    if not result['changed']:
+        return jsonify({'success': False, 'message': 'Tashmë në të preferuara!',
+                        **result, **user_counters(db, user_id)})
 
-    cursor.execute("INSERT INTO favorites (user_id, book_id) VALUES (?, ?)", (user_id, book_id))
-    db.commit()
-    db.close()
-    return jsonify({'success': True, 'message': 'Shtuar në të preferuara!'})
+    invalidate_favorites(user_id)
+    return jsonify({'success': True, 'message': 'Shtuar në të preferuara!',
+                    **result, **user_counters(db, user_id)})
 
 @app.route('/favorites')
 def favorites_page():
@@ -286,28 +464,71 @@ def favorites_page():
         return redirect(url_for('login'))
 
     db = get_database()
-    cursor = db.cursor()
-
-    cursor.execute("""
-        SELECT b.id, b.title, b.img, b.price
-        FROM favorites f
-        JOIN books b ON f.book_id = b.id
-        WHERE f.user_id = ?
-    """, (user_id,))
-    items = cursor.fetchall()
-    db.close()
-
-    return render_template('favorites.html', favorites=items)
+    catalog_version, catalog_updated_at = get_catalog_version(db)
+    stats = get_user_stats(db, user_id)
+
+    def render():
+        items = db.execute("""
+            SELECT b.id, b.title, b.img, b.price_cents
+            FROM favorites f
+            JOIN books b ON f.book_id = b.id
+            WHERE f.user_id = ?
+        """, (user_id,)).fetchall()
+
+        return render_template('favorites.html', favorites=items)
+
+    return conditional_page(
+        ('favorites', catalog_version, user_id, stats.favorites_version),
+        max(catalog_updated_at, stats.updated_at),
+        render
+    )
 
 @app.route('/remove_from_favorites/<int:book_id>')
 def remove_from_favorites(book_id):
     user_id = get_user_id()
     if user_id:
         db = get_database()
-        db.execute("DELETE FROM favorites WHERE user_id = ? AND book_id = ?", (user_id, book_id))
-        db.commit()
-        db.close()
+        with write_transaction(db):
+            actions.remove_from_favorites(db, user_id, book_id)
+        invalidate_favorites(user_id)
     return redirect(url_for('favorites_page'))
 
+# === BATCH ===
+# Several cart/favorites operations in one request and one transaction:
+# {"operations": [{"op": "add_to_cart", "book_id": 1}, ...]}
+@app.route('/api/batch', methods=['POST'])
+def api_batch():
+    user_id = get_user_id()
+    if not user_id:
+        return jsonify({'success': False, 'message': 'Duhet të kyçesh së pari!'}), 401
+
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not 0 < len(operations) <= actions.MAX_BATCH_OPERATIONS:
+        return jsonify({'success': False, 'message': 'Kërkesë e pavlefshme!'}), 400
+
+    parsed = []
+    for operation in operations:
+        handler = actions.BATCH_OPERATIONS.get(operation.get('op')) if isinstance(operation, dict) else None
+        book_id = parse_book_id(operation) if handler else None
+        if book_id is None:
+            return jsonify({'success': False, 'message': 'Kërkesë e pavlefshme!'}), 400
+        parsed.append((operation['op'], handler, book_id))
+
+    db = get_database()
+    try:
+        with write_transaction(db):
+            results = [dict(handler(db, user_id, book_id), op=op) for op, handler, book_id in parsed]
+    except sqlite3.IntegrityError:
+        return jsonify({'success': False, 'message': 'Libri nuk ekziston!'})
+
+    if any(op in actions.FAVORITES_OPERATIONS for op, _, _ in parsed):
+        invalidate_favorites(user_id)
+
+    return jsonify({'success': True, 'results': results, **user_counters(db, user_id)})
+
 if __name__ == '__main__':
+    # Deployments run `flask db upgrade` once instead
+    with app.app_context():
+        migrations.upgrade(get_database())
     app.run(debug=True)
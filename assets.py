@@ -0,0 +1,215 @@
+# assets.py
+# Fingerprinted static assets. Every file under static/ gets a content-hashed
+# URL (/assets/style.3f2a1b9c0d4e.css) that is served with a strong ETag and
+# `Cache-Control: immutable`, so browsers never revalidate it. `flask assets
+# build` also writes gzip/brotli variants and resized image derivatives to
+# static/dist/ together with a manifest; without a build the manifest is
+# computed in memory on first use.
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+from typing import NamedTuple
+
+import click
+from flask import Blueprint, current_app, abort, request, send_file, url_for
+from markupsafe import Markup
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+MAX_AGE = 365 * 24 * 60 * 60
+
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt'}
+RESPONSIVE = {'.jpg', '.jpeg', '.png'}
+RESPONSIVE_WIDTHS = (480, 960, 1600)
+
+bp = Blueprint('assets', __name__, cli_group='assets')
+
+
+class Manifest(NamedTuple):
+    urls: dict       # logical filename -> hashed filename
+    entries: dict    # hashed filename -> {'path', 'etag', 'encodings'}
+    srcsets: dict    # logical filename -> [[width, hashed filename], ...]
+
+
+_manifests = {}
+_lock = threading.Lock()
+
+
+def _hashed_name(filename, digest, suffix=''):
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}{suffix}.{digest}{ext}"
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _compressed_variants(static_folder, hashed, data):
+    encodings = {}
+    variants = [('gzip', '.gz', lambda d: gzip.compress(d, 9, mtime=0))]
+    if brotli is not None:
+        variants.append(('br', '.br', lambda d: brotli.compress(d, quality=11)))
+
+    for encoding, ext, compress in variants:
+        compressed = compress(data)
+        if len(compressed) < len(data):
+            path = os.path.join(DIST_DIR, hashed + ext)
+            _write(os.path.join(static_folder, path), compressed)
+            encodings[encoding] = path
+    return encodings
+
+
+def _image_derivatives(static_folder, filename, digest, manifest):
+    with Image.open(os.path.join(static_folder, filename)) as image:
+        original_width, original_height = image.size
+        for width in RESPONSIVE_WIDTHS:
+            if width >= original_width:
+                break
+            height = round(original_height * width / original_width)
+            hashed = _hashed_name(filename, digest, f".{width}w")
+            path = os.path.join(DIST_DIR, hashed)
+            resized = image.resize((width, height), Image.LANCZOS)
+            if resized.mode not in ('RGB', 'L') and filename.lower().endswith(('.jpg', '.jpeg')):
+                resized = resized.convert('RGB')
+            os.makedirs(os.path.dirname(os.path.join(static_folder, path)), exist_ok=True)
+            resized.save(os.path.join(static_folder, path), quality=80, optimize=True)
+
+            manifest.entries[hashed] = {'path': path, 'etag': f"{digest}-{width}w", 'encodings': {}}
+            manifest.srcsets.setdefault(filename, []).append([width, hashed])
+
+
+def build_manifest(static_folder, write=False):
+    manifest = Manifest({}, {}, {})
+
+    for root, dirs, files in os.walk(static_folder):
+        if root == static_folder and DIST_DIR in dirs:
+            dirs.remove(DIST_DIR)
+        for name in sorted(files):
+            path = os.path.relpath(os.path.join(root, name), static_folder)
+            filename = path.replace(os.sep, '/')
+            with open(os.path.join(root, name), 'rb') as f:
+                data = f.read()
+
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            hashed = _hashed_name(filename, digest)
+            ext = os.path.splitext(name)[1].lower()
+
+            encodings = {}
+            if write and ext in COMPRESSIBLE:
+                encodings = _compressed_variants(static_folder, hashed, data)
+            if write and Image is not None and ext in RESPONSIVE:
+                _image_derivatives(static_folder, filename, digest, manifest)
+
+            manifest.urls[filename] = hashed
+            manifest.entries[hashed] = {'path': path, 'etag': digest, 'encodings': encodings}
+
+    if write:
+        _write(os.path.join(static_folder, DIST_DIR, MANIFEST_NAME),
+               json.dumps(manifest._asdict(), indent=1, sort_keys=True).encode())
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)) as f:
+            return Manifest(**json.load(f))
+    except FileNotFoundError:
+        return build_manifest(static_folder)
+
+
+def get_manifest():
+    static_folder = current_app.static_folder
+    manifest = _manifests.get(static_folder)
+    if manifest is None:
+        with _lock:
+            manifest = _manifests.get(static_folder)
+            if manifest is None:
+                manifest = _manifests[static_folder] = load_manifest(static_folder)
+    return manifest
+
+
+# Drop-in replacement for url_for: static files get their fingerprinted URL
+def asset_url_for(endpoint, **values):
+    if endpoint == 'static' and 'filename' in values:
+        hashed = get_manifest().urls.get(values['filename'])
+        if hashed is not None:
+            return url_for('assets.serve', **dict(values, filename=hashed))
+    return url_for(endpoint, **values)
+
+
+def static_url(filename):
+    return asset_url_for('static', filename=filename)
+
+
+def asset_srcset(filename):
+    manifest = get_manifest()
+    derivatives = manifest.srcsets.get(filename)
+    if not derivatives:
+        return ''
+    return Markup(', ').join(
+        f"{url_for('assets.serve', filename=hashed)} {width}w" for width, hashed in derivatives
+    )
+
+
+@bp.route('/assets/<path:filename>')
+def serve(filename):
+    entry = get_manifest().entries.get(filename)
+    if entry is None:
+        abort(404)
+
+    path, etag, encoding = entry['path'], entry['etag'], None
+    accepted = request.accept_encodings
+    for candidate in ('br', 'gzip'):
+        if candidate in entry['encodings'] and accepted[candidate]:
+            path, etag, encoding = entry['encodings'][candidate], f"{etag}-{candidate}", candidate
+            break
+
+    response = send_file(
+        os.path.join(current_app.static_folder, path),
+        mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        download_name=os.path.basename(filename),
+        etag=etag,
+        max_age=MAX_AGE,
+        conditional=True,
+    )
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if entry['encodings']:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@bp.cli.command('build')
+def build_command():
+    """Fingerprint static files and write compressed and resized variants."""
+    manifest = build_manifest(current_app.static_folder, write=True)
+    variants = sum(len(e['encodings']) for e in manifest.entries.values())
+    click.echo(f"{len(manifest.urls)} assets, {variants} compressed variants, "
+               f"{sum(map(len, manifest.srcsets.values()))} image derivatives")
+    if brotli is None:
+        click.echo("brotli not installed; skipped .br variants")
+    if Image is None:
+        click.echo("Pillow not installed; skipped image derivatives")
+
+
+def init_app(app):
+    app.register_blueprint(bp)
+    app.jinja_env.globals['url_for'] = asset_url_for
+    app.jinja_env.globals['asset_srcset'] = asset_srcset
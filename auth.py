@@ -0,0 +1,172 @@
+# auth.py
+# Password hashing off the request threads. Hashes run in a small process
+# pool with a cap on in-flight jobs; when the cap is reached callers get
+# HashingBusy immediately instead of queueing behind a login storm. A pool
+# whose worker died is thrown away and rebuilt on the next call. Attempt
+# throttling is checked before any hashing work is submitted.
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Defaults for the app.config keys read here
+DEFAULT_CONFIG = {
+    'PASSWORD_HASH_METHOD': 'scrypt:32768:8:1',
+    'PASSWORD_HASH_WORKERS': 2,
+    'PASSWORD_HASH_MAX_PENDING': 8,      # in-flight hashes before rejecting
+    'PASSWORD_HASH_TIMEOUT': 10,         # seconds to wait for a worker
+    'LOGIN_IP_LIMIT': (30, 60),          # attempts per IP per window (seconds)
+    'LOGIN_ACCOUNT_LIMIT': (5, 300),     # failed attempts per (account, IP) per window
+    'SIGNUP_IP_LIMIT': (10, 3600),       # signups per IP per window
+}
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def _config(key):
+    return current_app.config.get(key, DEFAULT_CONFIG[key])
+
+
+class HashPool:
+
+    def __init__(self, workers, max_pending, timeout):
+        self.timeout = timeout
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._discard()
+            raise HashingBusy()
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the job is really gone (finished or
+        # cancelled), not just until this caller stops waiting for it, so
+        # the executor's queue can never grow past max_pending
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise HashingBusy()
+        except BrokenProcessPool:
+            self._discard()
+            raise HashingBusy()
+
+    # A worker crashed or was killed: the executor stays broken for good, so
+    # let get_hash_pool() build a fresh one
+    def _discard(self):
+        global _pool
+        with _pool_lock:
+            if _pool is self:
+                _pool = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_dummy_hashes = {}
+
+
+def get_hash_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashPool(
+                    workers=_config('PASSWORD_HASH_WORKERS'),
+                    max_pending=_config('PASSWORD_HASH_MAX_PENDING'),
+                    timeout=_config('PASSWORD_HASH_TIMEOUT'),
+                )
+    return _pool
+
+
+def hash_password(password):
+    return get_hash_pool().run(generate_password_hash, password, _config('PASSWORD_HASH_METHOD'))
+
+
+def verify_password(password_hash, password):
+    return get_hash_pool().run(check_password_hash, password_hash, password)
+
+
+# A fixed hash made with the configured method. Logins for unknown emails are
+# checked against it, so they take as long as logins for real accounts.
+def dummy_hash():
+    method = _config('PASSWORD_HASH_METHOD')
+    password_hash = _dummy_hashes.get(method)
+    if password_hash is None:
+        password_hash = _dummy_hashes[method] = get_hash_pool().run(generate_password_hash, '', method)
+    return password_hash
+
+
+# werkzeug stores the fully expanded method ("pbkdf2" -> "pbkdf2:sha256:1000000"),
+# so compare against the prefix of a hash made with the configured method
+def needs_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != dummy_hash().split('$', 1)[0]
+
+
+class SlidingWindow:
+    # In-process attempt counter: at most `limit` hits per key per `window` seconds
+
+    MAX_KEYS = 100000
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self._hits = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, hits, now):
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+
+    def retry_after(self, key):
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if not hits:
+                return 0
+            self._prune(hits, now)
+            if len(hits) < self.limit:
+                return 0
+            return int(hits[0] + self.window - now) + 1
+
+    def hit(self, key):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._hits) >= self.MAX_KEYS:
+                for stale in [k for k, h in self._hits.items() if not h or h[-1] <= now - self.window]:
+                    del self._hits[stale]
+            hits = self._hits.setdefault(key, deque())
+            self._prune(hits, now)
+            hits.append(now)
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+
+_throttles = {}
+_throttles_lock = threading.Lock()
+
+
+def get_throttle(name):
+    throttle = _throttles.get(name)
+    if throttle is None:
+        with _throttles_lock:
+            throttle = _throttles.get(name)
+            if throttle is None:
+                throttle = _throttles[name] = SlidingWindow(*_config(name))
+    return throttle
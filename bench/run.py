@@ -0,0 +1,417 @@
+# bench/run.py
+# Benchmarks every route against a seeded synthetic database and writes the
+# results as JSON so runs can be compared between commits:
+#
+#     python -m bench.run --books 100000 --users 50000 --output bench-new.json
+#     python -m bench.run --db /tmp/bench.db --compare bench-old.json
+#
+# Two phases run through the Flask test client: every route on its own
+# (sequential latency), then a weighted mix from concurrent workers
+# (throughput under contention). Both report p50/p95/p99 per route.
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import migrations
+from bench import seed as seeding
+
+METRICS_TOKEN = 'bench-metrics'
+REPORTS_TOKEN = 'bench-reports'
+SEARCH_TERMS = ['py', 'pyth', 'secure', 'data', 'linux kern', 'clean', 'machine learn', 'zzz']
+
+# Routes with expensive hashing get fewer iterations in the sequential phase
+HASHING_ROUTES = {'POST /login', 'POST /signup'}
+
+
+class Context:
+
+    def __init__(self, app, user_ids, book_ids, category_slugs):
+        self.app = app
+        self.user_ids = user_ids
+        self.book_ids = book_ids
+        self.category_slugs = category_slugs
+        self.asset_url = None
+        self.signups = 0
+        self.lock = threading.Lock()
+
+    def next_signup(self):
+        with self.lock:
+            self.signups += 1
+            return self.signups
+
+
+def login_as(client, user_id):
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['user_email'] = f"user{user_id}@bench.local"
+
+
+def logout(client):
+    with client.session_transaction() as session:
+        session.clear()
+
+
+# Each scenario does its untimed setup, then returns a zero-argument callable
+# that issues the timed request
+def index_anonymous(client, rng, ctx):
+    logout(client)
+    return lambda: client.get('/')
+
+
+def index_not_modified(client, rng, ctx):
+    logout(client)
+    etag = client.get('/').headers.get('ETag')
+    return lambda: client.get('/', headers={'If-None-Match': etag} if etag else {})
+
+
+def index_user(client, rng, ctx):
+    login_as(client, rng.choice(ctx.user_ids))
+    return lambda: client.get('/')
+
+
+def index_power_user(client, rng, ctx):
+    login_as(client, ctx.user_ids[0])
+    return lambda: client.get('/')
+
+
+def search(client, rng, ctx):
+    return lambda: client.get('/api/search', query_string={'q': rng.choice(SEARCH_TERMS)})
+
+
+def category_page(client, rng, ctx):
+    slug = rng.choice(ctx.category_slugs)
+    after = rng.choice([0] + ctx.book_ids)
+    return lambda: client.get(f'/api/categories/{slug}/books', query_string={'after': after})
+
+
+def cart_page(client, rng, ctx):
+    login_as(client, rng.choice(ctx.user_ids))
+    return lambda: client.get('/cart')
+
+
+def favorites_page(client, rng, ctx):
+    login_as(client, rng.choice(ctx.user_ids))
+    return lambda: client.get('/favorites')
+
+
+def add_to_cart(client, rng, ctx):
+    login_as(client, rng.choice(ctx.user_ids))
+    return lambda: client.post('/add_to_cart', json={'book_id': rng.choice(ctx.book_ids)})
+
+
+def add_to_favorites(client, rng, ctx):
+    login_as(client, rng.choice(ctx.user_ids))
+    return lambda: client.post('/add_to_favorites', json={'book_id': rng.choice(ctx.book_ids)})
+
+
+def batch(client, rng, ctx):
+    login_as(client, rng.choice(ctx.user_ids))
+    operations = [{'op': rng.choice(['add_to_cart', 'add_to_favorites', 'remove_from_favorites']),
+                   'book_id': rng.choice(ctx.book_ids)} for _ in range(5)]
+    return lambda: client.post('/api/batch', json={'operations': operations})
+
+
+def remove_from_cart(client, rng, ctx):
+    login_as(client, rng.choice(ctx.user_ids))
+    book_id = rng.choice(ctx.book_ids)
+    client.post('/add_to_cart', json={'book_id': book_id})
+    return lambda: client.get(f'/remove_from_cart/{book_id}')
+
+
+def remove_from_favorites(client, rng, ctx):
+    login_as(client, rng.choice(ctx.user_ids))
+    book_id = rng.choice(ctx.book_ids)
+    client.post('/add_to_favorites', json={'book_id': book_id})
+    return lambda: client.get(f'/remove_from_favorites/{book_id}')
+
+
+def clear_cart(client, rng, ctx):
+    login_as(client, rng.choice(ctx.user_ids))
+    client.post('/add_to_cart', json={'book_id': rng.choice(ctx.book_ids)})
+    return lambda: client.get('/clear_cart')
+
+
+def place_order(client, rng, ctx):
+    login_as(client, rng.choice(ctx.user_ids))
+    for book_id in rng.sample(ctx.book_ids, 3):
+        client.post('/add_to_cart', json={'book_id': book_id})
+    return lambda: client.post('/place_order', data={'idempotency_key': f"bench-{rng.random()}"})
+
+
+def order_history(client, rng, ctx):
+    login_as(client, rng.choice(ctx.user_ids))
+    return lambda: client.get('/api/orders')
+
+
+def best_sellers(client, rng, ctx):
+    days = rng.choice([None, 7, 30])
+    return lambda: client.get('/api/reports/best-sellers', query_string={'days': days} if days else {})
+
+
+def category_revenue(client, rng, ctx):
+    days = rng.choice([None, 7, 30])
+    return lambda: client.get('/api/reports/category-revenue', query_string={'days': days} if days else {},
+                              headers={'X-Reports-Token': REPORTS_TOKEN})
+
+
+def login_page(client, rng, ctx):
+    logout(client)
+    return lambda: client.get('/login')
+
+
+def signup_page(client, rng, ctx):
+    logout(client)
+    return lambda: client.get('/signup')
+
+
+def login(client, rng, ctx):
+    logout(client)
+    user_id = rng.choice(ctx.user_ids)
+    return lambda: client.post('/login', data={'email': f"user{user_id}@bench.local",
+                                               'password': seeding.PASSWORD})
+
+
+def signup(client, rng, ctx):
+    logout(client)
+    n = ctx.next_signup()
+    return lambda: client.post('/signup', data={'name': 'New', 'surname': 'User',
+                                                'email': f"new{n}-{os.getpid()}@bench.local",
+                                                'password': seeding.PASSWORD})
+
+
+def logout_route(client, rng, ctx):
+    login_as(client, rng.choice(ctx.user_ids))
+    return lambda: client.get('/logout')
+
+
+def metrics(client, rng, ctx):
+    return lambda: client.get('/metrics', headers={'Authorization': f"Bearer {METRICS_TOKEN}"})
+
+
+def static_asset(client, rng, ctx):
+    return lambda: client.get(ctx.asset_url)
+
+
+# name -> (scenario, weight in the concurrent mix)
+SCENARIOS = {
+    'GET / (anonymous)': (index_anonymous, 30),
+    'GET / (304)': (index_not_modified, 10),
+    'GET / (user)': (index_user, 10),
+    'GET / (power user)': (index_power_user, 1),
+    'GET /api/search': (search, 15),
+    'GET /api/categories/<slug>/books': (category_page, 10),
+    'GET /cart': (cart_page, 5),
+    'GET /favorites': (favorites_page, 3),
+    'POST /add_to_cart': (add_to_cart, 6),
+    'POST /add_to_favorites': (add_to_favorites, 4),
+    'POST /api/batch': (batch, 2),
+    'GET /remove_from_cart': (remove_from_cart, 1),
+    'GET /remove_from_favorites': (remove_from_favorites, 1),
+    'GET /clear_cart': (clear_cart, 1),
+    'POST /place_order': (place_order, 2),
+    'GET /api/orders': (order_history, 2),
+    'GET /api/reports/best-sellers': (best_sellers, 3),
+    'GET /api/reports/category-revenue': (category_revenue, 1),
+    'GET /login': (login_page, 1),
+    'GET /signup': (signup_page, 1),
+    'POST /login': (login, 1),
+    'POST /signup': (signup, 0),
+    'GET /logout': (logout_route, 1),
+    'GET /metrics': (metrics, 0),
+    'GET /assets/<file>': (static_asset, 5),
+}
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    ms = lambda v: None if v is None else round(v * 1000, 3)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+    }
+
+
+def timed(scenario, client, rng, ctx):
+    request = scenario(client, rng, ctx)
+    start = time.perf_counter()
+    response = request()
+    elapsed = time.perf_counter() - start
+    # Anything but 2xx/3xx is a failure, so an expired session or a missing
+    # token can't pass for a fast success
+    return elapsed, response.status_code >= 400
+
+
+def run_sequential(ctx, iterations, rng):
+    results = {}
+    client = ctx.app.test_client()
+    for name, (scenario, _) in SCENARIOS.items():
+        count = min(iterations, 20) if name in HASHING_ROUTES else iterations
+        latencies, errors = [], 0
+        started = time.perf_counter()
+        for _ in range(count):
+            elapsed, failed = timed(scenario, client, rng, ctx)
+            latencies.append(elapsed)
+            errors += failed
+        results[name] = summarize(latencies, errors, time.perf_counter() - started)
+        print(f"  {name:34} p50 {results[name]['p50_ms']:>8} ms  p99 {results[name]['p99_ms']:>8} ms")
+    return results
+
+
+def run_concurrent(ctx, concurrency, duration, seed):
+    names = [name for name, (_, weight) in SCENARIOS.items() if weight]
+    weights = [SCENARIOS[name][1] for name in names]
+    samples = {name: ([], [0]) for name in names}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(n):
+        rng = random.Random(seed + n)
+        client = ctx.app.test_client()
+        local = {name: ([], [0]) for name in names}
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            elapsed, failed = timed(SCENARIOS[name][0], client, rng, ctx)
+            local[name][0].append(elapsed)
+            local[name][1][0] += failed
+        with lock:
+            for name, (latencies, errors) in local.items():
+                samples[name][0].extend(latencies)
+                samples[name][1][0] += errors[0]
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    routes = {name: summarize(latencies, errors[0], elapsed) for name, (latencies, errors) in samples.items()}
+    everything = [v for latencies, _ in samples.values() for v in latencies]
+    total = summarize(everything, sum(errors[0] for _, errors in samples.values()), elapsed)
+    print(f"  {concurrency} workers, {total['requests']} requests, {total['throughput_rps']} req/s, "
+          f"p50 {total['p50_ms']} ms, p99 {total['p99_ms']} ms")
+    return {'concurrency': concurrency, 'duration_s': round(elapsed, 2), 'total': total, 'routes': routes}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} ({baseline['meta'].get('commit')}):")
+    for phase in ('sequential', 'concurrent'):
+        old_routes = baseline[phase] if phase == 'sequential' else baseline[phase]['routes']
+        new_routes = current[phase] if phase == 'sequential' else current[phase]['routes']
+        print(f"  {phase}")
+        for name, new in new_routes.items():
+            old = old_routes.get(name)
+            if not old or not old.get('p95_ms') or not new.get('p95_ms'):
+                continue
+            change = (new['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+            print(f"    {name:34} p95 {old['p95_ms']:>8} -> {new['p95_ms']:>8} ms ({change:+.0f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every pageAPI route.')
+    parser.add_argument('--db', help='database file; seeded if it does not exist (default: a temp file)')
+    parser.add_argument('--books', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=200, help='requests per route, sequential phase')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20, help='seconds, concurrent phase')
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--compare', help='earlier results JSON to diff against')
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='pageapi-bench-'), 'bench.db')
+    fresh = not os.path.exists(db_path)
+
+    # The app reads its database path at import time
+    os.environ['PAGEAPI_DATABASE'] = db_path
+    import apps
+
+    app = apps.app
+    app.config['PASSWORD_HASH_METHOD'] = seeding.PASSWORD_HASH_METHOD
+    app.config['METRICS_TOKEN'] = METRICS_TOKEN
+    app.config['REPORTS_TOKEN'] = REPORTS_TOKEN
+    for key in ('LOGIN_IP_LIMIT', 'LOGIN_ACCOUNT_LIMIT', 'SIGNUP_IP_LIMIT'):
+        app.config[key] = (10 ** 9, 1)
+
+    if fresh:
+        print(f"seeding {db_path}")
+        user_ids, book_ids = seeding.seed(db_path, books=args.books, users=args.users, seed=args.seed)
+    else:
+        print(f"reusing {db_path}")
+        db = sqlite3.connect(db_path)
+        migrations.upgrade(db)
+        user_ids = [r[0] for r in db.execute("SELECT id FROM users WHERE email LIKE '%@bench.local' ORDER BY id")]
+        book_ids = [r[0] for r in db.execute("SELECT id FROM books ORDER BY id")]
+        db.close()
+
+    db = sqlite3.connect(db_path)
+    category_slugs = [r[0] for r in db.execute("SELECT slug FROM categories ORDER BY id")]
+    db.close()
+
+    ctx = Context(app, user_ids, book_ids, category_slugs)
+    with app.test_request_context():
+        ctx.asset_url = apps.assets.static_url('style.css')
+
+    rng = random.Random(args.seed)
+    print("sequential")
+    sequential = run_sequential(ctx, args.iterations, rng)
+    print("concurrent")
+    concurrent = run_concurrent(ctx, args.concurrency, args.duration, args.seed)
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'books': len(book_ids),
+            'users': len(user_ids),
+            'seed': args.seed,
+            'iterations': args.iterations,
+        },
+        'sequential': sequential,
+        'concurrent': concurrent,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"wrote {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
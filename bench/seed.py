@@ -0,0 +1,161 @@
+# bench/seed.py
+# Builds a reproducible synthetic store: same arguments and seed always give
+# the same database, except that order dates are counted back from today so
+# the 7 and 30 day reports have data. Used by bench/run.py, or on its own:
+#
+#     python -m bench.seed /tmp/bench.db --books 100000 --users 50000
+import argparse
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+
+from werkzeug.security import generate_password_hash
+
+import migrations
+import sales
+
+# Cheap, fixed hash so seeding 50k users does not take hours; run.py points
+# PASSWORD_HASH_METHOD at the same method so logins never trigger a rehash
+PASSWORD = 'bench-password'
+PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+
+CHUNK = 5000
+ORDER_DAYS = 270      # orders are spread over this many days up to today
+
+CATEGORIES = [
+    "Programming General", "Interaction with hardware", "Secure Systems", "Databases",
+    "Distributed Systems", "Networking", "Machine Learning", "Web Development",
+    "Compilers", "Operating Systems", "Algorithms", "Mathematics",
+    "Software Architecture", "Testing", "DevOps", "Mobile Development",
+    "Game Development", "Embedded Systems", "Cryptography", "Data Engineering",
+]
+
+WORDS = (
+    "advanced applied practical modern functional concurrent secure scalable clean "
+    "python rust kernel network database compiler algorithm system design pattern "
+    "architecture testing cloud data machine learning linux unix web mobile embedded "
+    "crypto protocol engineering handbook guide primer cookbook internals deep dive "
+    "patterns principles fundamentals essentials mastery introduction"
+).split()
+
+IMAGES = [
+    "desginPetterns.jpeg", "clean-code.jpeg", "python-crash.jpeg", "pragmatic.jpeg",
+    "operating-systems.jpeg", "computer-arch.jpeg", "low.jpeg", "kernel.jpeg",
+    "black-hat.jpeg", "metasploit.jpeg", "social.jpeg", "net.jpeg",
+]
+
+
+def _title(rng, n):
+    words = rng.sample(WORDS, rng.randint(2, 5))
+    title = ' '.join(words).title()
+    # Titles with ',' and '|' used to break the catalog query; keep some around
+    if n % 97 == 0:
+        title += ', Vol. ' + str(n % 7 + 1)
+    elif n % 101 == 0:
+        title += ' | Second Edition'
+    return title
+
+
+def _chunks(rows, size=CHUNK):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def seed(db_path, books=100000, users=50000, cart_ratio=0.2, favorites_ratio=0.3,
+         orders_ratio=0.1, power_users=5, seed=42, log=print):
+    rng = random.Random(seed)
+    db = sqlite3.connect(db_path)
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("PRAGMA synchronous = OFF")
+    migrations.upgrade(db)
+    started = time.perf_counter()
+
+    with db:
+        db.execute("DELETE FROM books")
+    book_rows = ((_title(rng, n), rng.choice(IMAGES), rng.randint(500, 6000), rng.choice(CATEGORIES))
+                 for n in range(books))
+    for chunk in _chunks(book_rows):
+        with db:
+            db.executemany("INSERT INTO books (title, img, price_cents, category) VALUES (?, ?, ?, ?)", chunk)
+    book_ids = [row[0] for row in db.execute("SELECT id FROM books ORDER BY id")]
+    prices = dict(db.execute("SELECT id, price_cents FROM books"))
+    log(f"  {len(book_ids)} books")
+
+    password_hash = generate_password_hash(PASSWORD, PASSWORD_HASH_METHOD)
+    user_rows = ((f"User{n}", "Bench", f"user{n}@bench.local", password_hash) for n in range(users))
+    for chunk in _chunks(user_rows):
+        with db:
+            db.executemany("INSERT OR IGNORE INTO users (name, surname, email, password_hash) VALUES (?, ?, ?, ?)", chunk)
+    user_ids = [row[0] for row in db.execute("SELECT id FROM users WHERE email LIKE '%@bench.local' ORDER BY id")]
+    log(f"  {len(user_ids)} users")
+
+    cart_rows = []
+    for user_id in rng.sample(user_ids, int(len(user_ids) * cart_ratio)):
+        for book_id in rng.sample(book_ids, rng.randint(1, 5)):
+            cart_rows.append((user_id, book_id, rng.randint(1, 3)))
+    for chunk in _chunks(cart_rows):
+        with db:
+            db.executemany("INSERT OR IGNORE INTO cart (user_id, book_id, quantity) VALUES (?, ?, ?)", chunk)
+    log(f"  {len(cart_rows)} cart rows")
+
+    favorite_rows = []
+    for user_id in rng.sample(user_ids, int(len(user_ids) * favorites_ratio)):
+        for book_id in rng.sample(book_ids, rng.randint(1, 20)):
+            favorite_rows.append((user_id, book_id))
+    # A few power users with thousands of favorites
+    for user_id in user_ids[:power_users]:
+        for book_id in rng.sample(book_ids, min(len(book_ids), 3000)):
+            favorite_rows.append((user_id, book_id))
+    for chunk in _chunks(favorite_rows):
+        with db:
+            db.executemany("INSERT OR IGNORE INTO favorites (user_id, book_id) VALUES (?, ?)", chunk)
+    log(f"  {len(favorite_rows)} favorites")
+
+    today = datetime.now(timezone.utc)
+    order_count = item_count = 0
+    for order_users in _chunks(rng.sample(user_ids, int(len(user_ids) * orders_ratio)), 1000):
+        with db:
+            for user_id in order_users:
+                for _ in range(rng.randint(1, 3)):
+                    items = [(book_id, rng.randint(1, 3)) for book_id in rng.sample(book_ids, rng.randint(1, 4))]
+                    total = sum(prices[book_id] * quantity for book_id, quantity in items)
+                    order_date = (today - timedelta(days=rng.randrange(ORDER_DAYS))).strftime('%Y-%m-%d 12:00:00')
+                    order_id = db.execute(
+                        "INSERT INTO orders (user_id, order_date, total_cents) VALUES (?, ?, ?)",
+                        (user_id, order_date, total)
+                    ).lastrowid
+                    db.executemany(
+                        "INSERT INTO order_items (order_id, book_id, quantity, price_cents) VALUES (?, ?, ?, ?)",
+                        [(order_id, book_id, quantity, prices[book_id]) for book_id, quantity in items]
+                    )
+                    order_count += 1
+                    item_count += len(items)
+    sales.backfill(db)
+    log(f"  {order_count} orders, {item_count} order items")
+
+    db.execute("ANALYZE")
+    db.close()
+    log(f"  seeded in {time.perf_counter() - started:.1f}s")
+    return user_ids, book_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed a synthetic pageAPI database.')
+    parser.add_argument('database')
+    parser.add_argument('--books', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    seed(args.database, books=args.books, users=args.users, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
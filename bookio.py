@@ -0,0 +1,263 @@
+# bookio.py
+# Bulk catalog import/export: `flask books import FILE` and
+# `flask books export [FILE]`, as CSV or JSON lines. Files are streamed in
+# chunks, so memory stays flat whatever their size. Each chunk of an import
+# is one short write transaction, so live checkouts wait for at most one
+# chunk, and an interrupted import leaves every committed chunk complete.
+# Inside a chunk the per-row search index and catalog version triggers are
+# switched off (see the bulk_import step in migrations.py) and replaced by
+# set-based statements. Rows the database rejects are reported and skipped.
+import csv
+import itertools
+import json
+import os
+import sqlite3
+import time
+
+import click
+from flask import Blueprint
+
+from database import get_database, write_transaction
+from money import parse_price
+
+COLUMNS = ('isbn', 'title', 'img', 'price_cents', 'category')
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+DEFAULT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 20
+
+# Rows are matched on ISBN; rows without one are always inserted. Unchanged
+# rows are left alone so they don't count as catalog changes.
+UPSERT_SQL = """
+    INSERT INTO books (isbn, title, img, price_cents, category)
+    SELECT isbn, title, img, price_cents, category FROM temp.import_rows WHERE true
+    ON CONFLICT (isbn) WHERE isbn IS NOT NULL DO UPDATE SET
+        title = excluded.title,
+        img = excluded.img,
+        price_cents = excluded.price_cents,
+        category = excluded.category
+    WHERE (title, img, price_cents, category)
+        IS NOT (excluded.title, excluded.img, excluded.price_cents, excluded.category)
+"""
+
+bp = Blueprint('books', __name__, cli_group='books')
+
+
+def _format_for(path, fmt):
+    if fmt:
+        return fmt
+    fmt = FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise click.BadParameter(f"can't tell the format of {path!r}; pass --format", param_hint='--format')
+    return fmt
+
+
+def _open(path, mode):
+    if path == '-':
+        return click.open_file(path, mode)
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def _read_jsonl(f):
+    for line in f:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+
+READERS = {'csv': csv.DictReader, 'jsonl': _read_jsonl}
+
+
+def _text(record, key, required=True):
+    value = record.get(key)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise ValueError(f"missing {key}")
+    return value
+
+
+# Whole cents only: 12.99 is a price in the wrong unit, not 12 cents
+def _price_cents(value):
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"invalid price_cents: {value!r}")
+    try:
+        cents = int(value.strip() if isinstance(value, str) else value)
+    except ValueError:
+        raise ValueError(f"invalid price_cents: {value!r}")
+    if cents < 0:
+        raise ValueError(f"invalid price_cents: {value!r}")
+    return cents
+
+
+def parse_record(record):
+    if not isinstance(record, dict):
+        raise ValueError("not a JSON object")
+
+    if record.get('price_cents') not in (None, ''):
+        price_cents = _price_cents(record['price_cents'])
+    else:
+        price_cents = parse_price(_text(record, 'price'))
+
+    return (
+        _text(record, 'isbn', required=False).replace('-', '') or None,
+        _text(record, 'title'),
+        _text(record, 'img', required=False),
+        price_cents,
+        _text(record, 'category'),
+    )
+
+
+def _create_staging(db):
+    db.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS import_rows (
+            isbn TEXT, title TEXT, img TEXT, price_cents INTEGER, category TEXT
+        )
+    """)
+    # Existing books whose indexed text the current chunk changes
+    db.execute("CREATE TEMP TABLE IF NOT EXISTS import_reindex (id INTEGER PRIMARY KEY)")
+
+
+def import_chunk(db, rows):
+    with write_transaction(db):
+        # Only the search index and version triggers check this flag; the
+        # category triggers still give every row its category_id
+        db.execute("INSERT INTO bulk_import (id) VALUES (1)")
+        db.execute("DELETE FROM temp.import_rows")
+        db.execute("DELETE FROM temp.import_reindex")
+        db.executemany("INSERT INTO temp.import_rows VALUES (?, ?, ?, ?, ?)", rows)
+
+        # Take changed rows out of the search index while their old text is
+        # still there, upsert, then index everything new or changed
+        db.execute("""
+            INSERT OR IGNORE INTO temp.import_reindex (id)
+            SELECT b.id FROM temp.import_rows s JOIN books b ON b.isbn = s.isbn
+            WHERE (b.title, b.category) IS NOT (s.title, s.category)
+        """)
+        db.execute("""
+            INSERT INTO books_fts (books_fts, rowid, title, category)
+            SELECT 'delete', b.id, b.title, b.category
+            FROM temp.import_reindex r JOIN books b ON b.id = r.id
+        """)
+        last_id = db.execute("SELECT IFNULL(MAX(id), 0) FROM books").fetchone()[0]
+        written = db.execute(UPSERT_SQL).rowcount
+        db.execute("""
+            INSERT INTO books_fts (rowid, title, category)
+            SELECT id, title, category FROM books WHERE id > ?
+        """, (last_id,))
+        db.execute("""
+            INSERT INTO books_fts (rowid, title, category)
+            SELECT b.id, b.title, b.category
+            FROM temp.import_reindex r JOIN books b ON b.id = r.id
+        """)
+        if written:
+            db.execute("UPDATE catalog_meta SET version = version + 1 WHERE id = 1")
+        db.execute("DELETE FROM bulk_import")
+    return written
+
+
+class Progress:
+
+    def __init__(self, verb, interval=1.0):
+        self.verb = verb
+        self.interval = interval
+        self.started = self.reported = time.monotonic()
+
+    def update(self, count, extra='', final=False):
+        now = time.monotonic()
+        if not final and now - self.reported < self.interval:
+            return
+        self.reported = now
+        rate = count / max(now - self.started, 1e-9)
+        click.echo(f"{count:,} rows {self.verb}{extra} ({rate:,.0f} rows/s)", err=True)
+
+
+@bp.cli.command('import')
+@click.argument('path')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help="Defaults to the file extension.")
+@click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True, help="Rows per write transaction.")
+@click.option('--pause-ms', default=10, show_default=True, help="Pause between chunks to let live writers in.")
+def import_command(path, fmt, chunk_size, pause_ms):
+    """Insert or update books from a CSV or JSON lines file (- for stdin)."""
+    fmt = _format_for(path, fmt)
+    db = get_database()
+    read = written = skipped = 0
+    progress = Progress('read')
+
+    def report(number, error):
+        if skipped <= MAX_REPORTED_ERRORS:
+            click.echo(f"record {number}: {error}", err=True)
+
+    _create_staging(db)
+    with _open(path, 'r') as f:
+        records = enumerate(READERS[fmt](f), 1)
+        while True:
+            batch = list(itertools.islice(records, chunk_size))
+            if not batch:
+                break
+            chunk = []
+            for number, record in batch:
+                try:
+                    chunk.append((number, parse_record(record)))
+                except (ValueError, TypeError) as e:
+                    skipped += 1
+                    report(number, e)
+            read += len(batch)
+
+            if chunk:
+                try:
+                    written += import_chunk(db, [row for _, row in chunk])
+                except sqlite3.IntegrityError:
+                    # The chunk was rolled back; redo it a row at a time to
+                    # find the rows the database rejects
+                    for number, row in chunk:
+                        try:
+                            written += import_chunk(db, [row])
+                        except sqlite3.IntegrityError as e:
+                            skipped += 1
+                            report(number, e)
+            progress.update(read, f", {written:,} written")
+            time.sleep(pause_ms / 1000)
+
+    db.execute("PRAGMA optimize")
+    progress.update(read, f", {written:,} written, {skipped:,} skipped", final=True)
+
+
+@bp.cli.command('export')
+@click.argument('path', default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help="Defaults to the file extension.")
+@click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True, help="Rows read per query.")
+def export_command(path, fmt, chunk_size):
+    """Write every book as CSV or JSON lines (default: CSV on stdout)."""
+    fmt = _format_for(path, fmt or ('csv' if path == '-' else None))
+    db = get_database()
+    count = 0
+    after = 0
+    progress = Progress('written')
+
+    with _open(path, 'w') as f:
+        if fmt == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+        # Keyset chunks by id, so no read transaction stays open for the whole export
+        while True:
+            rows = db.execute(f"""
+                SELECT id, {', '.join(COLUMNS)} FROM books WHERE id > ? ORDER BY id LIMIT ?
+            """, (after, chunk_size)).fetchall()
+            if not rows:
+                break
+            for row in rows:
+                values = tuple(row)[1:]
+                if fmt == 'csv':
+                    writer.writerow(values)
+                else:
+                    f.write(json.dumps(dict(zip(COLUMNS, values)), ensure_ascii=False) + '\n')
+            after = rows[-1]['id']
+            count += len(rows)
+            progress.update(count)
+
+    progress.update(count, final=True)
+
+
+def init_app(app):
+    app.register_blueprint(bp)
@@ -0,0 +1,113 @@
+# catalog.py
+import threading
+from typing import NamedTuple
+from types import MappingProxyType
+
+from flask import current_app, render_template
+from markupsafe import Markup
+
+# Books shown per category before the page lazy-loads the rest
+DEFAULT_PREVIEW_SIZE = 12
+MAX_PAGE_SIZE = 100
+
+
+class CatalogSnapshot(NamedTuple):
+    version: int
+    updated_at: int                # unix seconds of the last catalog change
+    books: MappingProxyType        # category -> tuple of the first books (by id)
+    nav_categories: tuple          # (slug, link_text, category)
+    next_after: MappingProxyType   # category -> id to continue from, or None
+
+
+_snapshot = None
+_fragment = None    # (version, rendered catalog section)
+_lock = threading.Lock()
+
+
+def get_catalog_version(db):
+    row = db.execute("SELECT version, updated_at FROM catalog_meta WHERE id = 1").fetchone()
+    return tuple(row) if row else (0, 0)
+
+
+def category_books(db, category_id, after=0, limit=DEFAULT_PREVIEW_SIZE):
+    # Keyset page over idx_books_category (category_id, id); one extra row
+    # tells whether there is more
+    rows = db.execute("""
+        SELECT id, title, img, price_cents
+        FROM books
+        WHERE category_id = ? AND id > ?
+        ORDER BY id
+        LIMIT ?
+    """, (category_id, after, limit + 1)).fetchall()
+
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = rows[-1]['id']
+    return rows, next_after
+
+
+def get_category(db, slug):
+    return db.execute("SELECT id, name, slug FROM categories WHERE slug = ?", (slug,)).fetchone()
+
+
+def build_snapshot(db, version, updated_at):
+    preview_size = current_app.config.get('CATALOG_PREVIEW_SIZE', DEFAULT_PREVIEW_SIZE)
+    categories = db.execute("SELECT id, name, slug FROM categories ORDER BY name").fetchall()
+
+    books = {}
+    next_after = {}
+    nav_categories = []
+    for category in categories:
+        rows, after = category_books(db, category['id'], limit=preview_size)
+        if not rows:
+            continue
+        name = category['name']
+        books[name] = tuple(
+            {"id": row['id'], "title": row['title'], "img": row['img'], "price_cents": row['price_cents']}
+            for row in rows
+        )
+        next_after[name] = after
+        nav_categories.append((category['slug'], name.split()[0], name))
+
+    return CatalogSnapshot(
+        version=version,
+        updated_at=updated_at,
+        books=MappingProxyType(books),
+        nav_categories=tuple(nav_categories),
+        next_after=MappingProxyType(next_after),
+    )
+
+
+# Process-wide snapshot, rebuilt only when the catalog version has moved on
+def get_catalog(db):
+    global _snapshot
+
+    version, updated_at = get_catalog_version(db)
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = build_snapshot(db, version, updated_at)
+        return _snapshot
+
+
+# The book sections are the same for every visitor (hearts are filled in
+# client-side), so they are rendered once per catalog version
+def get_catalog_html(snapshot):
+    global _fragment
+
+    fragment = _fragment
+    if fragment is not None and fragment[0] == snapshot.version:
+        return fragment[1]
+
+    html = Markup(render_template(
+        '_catalog.html',
+        books=snapshot.books,
+        nav_categories=snapshot.nav_categories,
+        next_after=snapshot.next_after,
+    ))
+    _fragment = (snapshot.version, html)
+    return html
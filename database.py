@@ -1,120 +1,120 @@
-# database.py
+import os
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
 from flask import g, current_app
 
-DATABASE = '/home/dion/pageAPI/booksAPI.db'  # Your DB path
+from metrics import InstrumentedConnection
+
+DEFAULT_DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'booksAPI.db')
+
+# Defaults for the app.config keys read by the connection manager
+DEFAULT_CONFIG = {
+    'DATABASE': DEFAULT_DATABASE,
+    'DATABASE_POOL_SIZE': 8,             # idle connections kept per process
+    'DATABASE_CACHED_STATEMENTS': 256,   # prepared statements cached per connection
+    'DATABASE_BUSY_TIMEOUT_MS': 5000,
+    'DATABASE_MMAP_SIZE': 256 * 1024 * 1024,
+    'DATABASE_CACHE_SIZE_KB': 16 * 1024,
+}
+
+
+def _config(key):
+    return current_app.config.get(key, DEFAULT_CONFIG[key])
+
+
+class ConnectionPool:
+    # Long-lived connections handed out one request at a time. Connections
+    # are tuned once when opened and reused across requests and threads.
+
+    def __init__(self, path, size, cached_statements, pragmas):
+        self.path = path
+        self.size = size
+        self.cached_statements = cached_statements
+        self.pragmas = pragmas
+        self._idle = queue.LifoQueue()
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+            factory=InstrumentedConnection,
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self.connect()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        if self._idle.qsize() < self.size:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool():
+    path = _config('DATABASE')
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                pool = _pools[path] = ConnectionPool(
+                    path,
+                    size=_config('DATABASE_POOL_SIZE'),
+                    cached_statements=_config('DATABASE_CACHED_STATEMENTS'),
+                    pragmas=(
+                        "PRAGMA journal_mode = WAL",
+                        "PRAGMA synchronous = NORMAL",
+                        f"PRAGMA busy_timeout = {int(_config('DATABASE_BUSY_TIMEOUT_MS'))}",
+                        f"PRAGMA mmap_size = {int(_config('DATABASE_MMAP_SIZE'))}",
+                        f"PRAGMA cache_size = -{int(_config('DATABASE_CACHE_SIZE_KB'))}",
+                        "PRAGMA foreign_keys = ON",
+                        "PRAGMA temp_store = MEMORY",
+                    ),
+                )
+    return pool
 
-def connect_to_database():
-    sql = sqlite3.connect(DATABASE)
-    sql.row_factory = sqlite3.Row
-    return sql
 
 def get_database():
     if not hasattr(g, 'books_db'):
-        g.books_db = connect_to_database()
+        g.books_db = get_pool().acquire()
     return g.books_db
 
 def close_database(e=None):
     db = g.pop('books_db', None)
     if db is not None:
-        db.close()
-
-def init_db(app):
-    with app.app_context():
-        db = get_database()
-        cursor = db.cursor()
-
-        # Create books table (only if not exists)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS books (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                img TEXT NOT NULL,
-                price TEXT NOT NULL,
-                category TEXT NOT NULL
-            )
-        ''')
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS cart (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                book_id INTEGER NOT NULL,
-                quantity INTEGER DEFAULT 1,
-                FOREIGN KEY (book_id) REFERENCES books (id) ON DELETE CASCADE,
-                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-            )
-        ''')
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS favorites (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                book_id INTEGER NOT NULL,
-                UNIQUE(user_id, book_id),
-                FOREIGN KEY (book_id) REFERENCES books (id) ON DELETE CASCADE,
-                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-            )
-        ''')
-                
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                surname TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL
-            )
-        ''')
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS orders (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                total_price TEXT NOT NULL,
-                status TEXT DEFAULT 'Pending',
-                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-            )
-        ''')
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS order_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                order_id INTEGER NOT NULL,
-                book_id INTEGER NOT NULL,
-                quantity INTEGER NOT NULL,
-                price TEXT NOT NULL,
-                FOREIGN KEY (order_id) REFERENCES orders (id) ON DELETE CASCADE,
-                FOREIGN KEY (book_id) REFERENCES books (id) ON DELETE CASCADE
-            )
-        ''')
-
-        # Insert default books ONLY if table is empty
-        cursor.execute("SELECT COUNT(*) FROM books")
-        if cursor.fetchone()[0] == 0:
-            default_books = [
-                ("Desgin Patterns", "desginPetterns.jpeg", "30.00$", "Programming General"),
-                ("Clean Code", "clean-code.jpeg", "25.00$", "Programming General"),
-                ("Python Crash Course", "python-crash.jpeg", "20.00$", "Programming General"),
-                ("The Pragmatic Programmer", "pragmatic.jpeg", "15.00$", "Programming General"),
-                ("Operating Systems-Three pieces", "operating-systems.jpeg", "20.00$", "Interaction with hardware"),
-                ("Computer Architecture", "computer-arch.jpeg", "17.00$", "Interaction with hardware"),
-                ("Low-Level Programming", "low.jpeg", "22.00$", "Interaction with hardware"),
-                ("Linux-Kernel Development", "kernel.jpeg", "19.00$", "Interaction with hardware"),
-                ("Black-Hat Python", "black-hat.jpeg", "23.00$", "Secure Systmes"),
-                ("Metasploit", "metasploit.jpeg", "31.00$", "Secure Systmes"),
-                ("Social Eengineering", "social.jpeg", "15.00$", "Secure Systmes"),
-                ("Networking Top-Down Approach", "net.jpeg", "19.00$", "Secure Systmes"),
-            ]
-
-            cursor.executemany('''
-                INSERT INTO books (title, img, price, category)
-                VALUES (?, ?, ?, ?)
-            ''', default_books)
-
-            db.commit()
-            print("Default books inserted!")
-
-        db.commit()
+        get_pool().release(db)
+
+# Short write transaction that takes SQLite's write lock up front, so
+# concurrent writers queue on busy_timeout instead of failing mid-way
+@contextmanager
+def write_transaction(db):
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        yield db
+    except BaseException:
+        db.rollback()
+        raise
+    db.commit()
@@ -0,0 +1,41 @@
+# jinjacache.py
+# Compiled templates are kept on disk in Jinja's bytecode cache, so a freshly
+# started worker loads them instead of compiling them on its first requests.
+# `flask templates compile` fills the cache at deploy time; the app only uses
+# a cache directory that already exists and is writable, so importing it
+# never writes to disk and a read-only deploy just compiles in memory.
+import os
+
+import click
+from flask import Blueprint, current_app
+from jinja2 import FileSystemBytecodeCache
+
+bp = Blueprint('templates', __name__, cli_group='templates')
+
+
+def cache_dir(app):
+    return app.config.get('JINJA_BYTECODE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja')
+
+
+def precompile(app):
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+
+@bp.cli.command('compile')
+def compile_command():
+    """Compile every template into the bytecode cache."""
+    app = current_app._get_current_object()
+    directory = cache_dir(app)
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    precompile(app)
+    click.echo(f"compiled {len(app.jinja_env.list_templates())} templates into {directory}")
+
+
+# Only attaches an existing cache; see compile_command for filling it
+def init_app(app):
+    app.register_blueprint(bp)
+    directory = cache_dir(app)
+    if os.path.isdir(directory) and os.access(directory, os.W_OK):
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
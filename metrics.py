@@ -0,0 +1,196 @@
+# metrics.py
+# Request and SQL instrumentation. Every route records its latency, and
+# every statement run through an InstrumentedConnection is counted and
+# timed against the current request. Totals are exposed in Prometheus
+# text format at /metrics to scrapers presenting METRICS_TOKEN as a bearer
+# token. Statements slower than SLOW_QUERY_MS are logged together with
+# their EXPLAIN QUERY PLAN.
+import bisect
+import hmac
+import logging
+import sqlite3
+import threading
+import time
+
+from flask import Blueprint, abort, current_app, g, has_app_context, has_request_context, request
+
+logger = logging.getLogger('pageapi.sql')
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+PLANNABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+bp = Blueprint('metrics', __name__)
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}    # (name, labels) -> Histogram
+        self.counters = {}      # (name, labels) -> number
+
+    def observe(self, name, labels, value, buckets):
+        with self._lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, labels, value=1):
+        with self._lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0) + value
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"{name}{_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+registry = Registry()
+
+
+# === SQL ===
+def _record_statement(conn, sql, params, elapsed):
+    if has_request_context():
+        g.sql_count = g.get('sql_count', 0) + 1
+        g.sql_time = g.get('sql_time', 0.0) + elapsed
+
+    threshold = current_app.config.get('SLOW_QUERY_MS') if has_app_context() else None
+    if threshold is not None and elapsed * 1000 >= threshold:
+        logger.warning("slow query (%.1f ms): %s\n%s",
+                       elapsed * 1000, ' '.join(sql.split()), _query_plan(conn, sql, params))
+
+
+def _query_plan(conn, sql, params):
+    if params is None or not sql.lstrip().upper().startswith(PLANNABLE):
+        return "    (no plan)"
+    try:
+        # Plain sqlite3.Cursor so the EXPLAIN itself is not recorded
+        rows = sqlite3.Cursor(conn).execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+    except sqlite3.Error as e:
+        return f"    (no plan: {e})"
+    return '\n'.join(f"    {row[3]}" for row in rows) or "    (no plan)"
+
+
+def _record_rows(rows):
+    if rows and has_request_context():
+        g.sql_rows = g.get('sql_rows', 0) + rows
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_statement(self.connection, sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_statement(self.connection, sql, None, time.perf_counter() - start)
+
+    def fetchone(self):
+        row = super().fetchone()
+        _record_rows(row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        _record_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        _record_rows(len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        _record_rows(1)
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    # Connection.execute() does not go through cursor(), so route it there
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# === REQUESTS ===
+def _before_request():
+    g.request_start = time.perf_counter()
+
+
+def _after_request(response):
+    start = g.pop('request_start', None)
+    if start is None:
+        return response
+
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    labels = (('method', request.method), ('route', route))
+    registry.observe('http_request_duration_seconds', labels, time.perf_counter() - start, LATENCY_BUCKETS)
+    registry.inc('http_requests_total', labels + (('status', str(response.status_code)),))
+    registry.observe('sql_statements_per_request', labels, g.get('sql_count', 0), QUERY_COUNT_BUCKETS)
+    registry.observe('sql_seconds_per_request', labels, g.get('sql_time', 0.0), LATENCY_BUCKETS)
+    registry.inc('sql_rows_returned_total', labels, g.get('sql_rows', 0))
+    return response
+
+
+# Disabled unless METRICS_TOKEN is configured
+@bp.route('/metrics')
+def metrics():
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token or not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        abort(403)
+    return registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+def init_app(app):
+    app.register_blueprint(bp)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
@@ -0,0 +1,694 @@
+# migrations.py
+# Schema migrations keyed on PRAGMA user_version. Each step runs once, in
+# order, in its own write transaction, and the stored version records how
+# many steps a database has had. When the schema is current `upgrade()` is a
+# single header read. Databases from before this scheme start at version 0;
+# every step checks what is already there, so replaying them is safe.
+#
+# Run with `flask db upgrade`; the app itself never changes the schema on
+# startup. Until the schema is current every request gets a 503 saying so.
+# New steps go at the end of MIGRATIONS; never reorder or remove one.
+#
+# Databases from before integer prices need SQLite 3.35 or newer (for
+# ALTER TABLE ... DROP COLUMN); the price step checks this before it starts.
+import logging
+import sqlite3
+
+import click
+from flask import Blueprint, current_app
+
+from database import get_database, write_transaction
+from money import parse_price
+
+MIN_SQLITE_DROP_COLUMN = (3, 35, 0)
+MAX_REPORTED_PRICES = 10
+
+logger = logging.getLogger('pageapi.migrations')
+
+# Slugs as first shipped; only the original categories step uses this
+LEGACY_SLUG_SQL = "lower(replace(trim({column}), ' ', '-'))"
+
+# Category slugs are [a-z0-9-] only: common accented letters are folded,
+# every other character becomes a single '-', and a name with nothing left
+# falls back to 'category'. Walks the name one character at a time.
+SLUG_FOLD_FROM = 'ëËçÇéÉèÈêáÁàâäÄíÍïóÓöÖôúÚüÜñÑ'
+SLUG_FOLD_TO = 'eecceeeeeaaaaaaiiiooooouuuunn'
+
+
+def category_slug_sql(name):
+    char = f"lower(substr({name}, i, 1))"
+    return f"""(
+        WITH RECURSIVE walk (i, slug) AS (
+            SELECT 1, ''
+            UNION ALL
+            SELECT i + 1, slug || CASE
+                WHEN {char} GLOB '[a-z0-9]' THEN {char}
+                WHEN instr('{SLUG_FOLD_FROM}', {char}) THEN substr('{SLUG_FOLD_TO}', instr('{SLUG_FOLD_FROM}', {char}), 1)
+                WHEN substr(slug, -1) = '-' THEN ''
+                ELSE '-'
+            END
+            FROM walk WHERE i <= length({name})
+        )
+        SELECT IFNULL(NULLIF(trim(slug, '-'), ''), 'category') FROM walk ORDER BY i DESC LIMIT 1
+    )"""
+
+
+# Gives a category holding a placeholder slug ('~' + random hex, which no
+# real slug can equal) its real one. A slug that is already taken gets
+# '--<id>' appended; real slugs never contain '--', so that is always free.
+def assign_slug_sql(name, where):
+    return f"""
+        UPDATE categories SET slug = (
+            SELECT CASE
+                WHEN NOT EXISTS (SELECT 1 FROM categories c WHERE c.slug = base) THEN base
+                ELSE base || '--' || categories.id
+            END
+            FROM (SELECT {category_slug_sql(name)} AS base)
+        )
+        WHERE {where}
+    """
+
+
+bp = Blueprint('db', __name__, cli_group='db')
+
+
+# A step can't go ahead; its transaction is rolled back and nothing changes
+class MigrationError(Exception):
+    pass
+
+
+def _columns(cursor, table):
+    return {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+
+
+def _schema_object_exists(cursor, kind, name):
+    return cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?", (kind, name)
+    ).fetchone() is not None
+
+
+def _table_exists(cursor, name):
+    return _schema_object_exists(cursor, 'table', name)
+
+
+def _index_exists(cursor, name):
+    return _schema_object_exists(cursor, 'index', name)
+
+
+# Parsed with the same rules as imports; any price that doesn't parse stops
+# the migration rather than silently becoming 0
+def _migrate_text_price(cursor, table, old_column, new_column):
+    if old_column not in _columns(cursor, table):
+        return
+    if sqlite3.sqlite_version_info < MIN_SQLITE_DROP_COLUMN:
+        raise MigrationError(
+            f"converting {table}.{old_column} needs SQLite "
+            f"{'.'.join(map(str, MIN_SQLITE_DROP_COLUMN))} or newer; this Python has {sqlite3.sqlite_version}"
+        )
+
+    prices, invalid = [], []
+    for rowid, text in cursor.execute(f"SELECT rowid, {old_column} FROM {table}").fetchall():
+        try:
+            prices.append((parse_price(text), rowid))
+        except ValueError:
+            invalid.append(f"rowid {rowid}: {text!r}")
+    if invalid:
+        shown = ', '.join(invalid[:MAX_REPORTED_PRICES])
+        more = f" and {len(invalid) - MAX_REPORTED_PRICES} more" if len(invalid) > MAX_REPORTED_PRICES else ''
+        raise MigrationError(f"{len(invalid)} unparseable prices in {table}.{old_column}: {shown}{more}; fix them and rerun")
+
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {new_column} INTEGER NOT NULL DEFAULT 0")
+    cursor.executemany(f"UPDATE {table} SET {new_column} = ? WHERE rowid = ?", prices)
+    cursor.execute(f"ALTER TABLE {table} DROP COLUMN {old_column}")
+
+
+# === STEPS ===
+
+# The original schema
+def _create_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            img TEXT NOT NULL,
+            price_cents INTEGER NOT NULL,
+            category TEXT NOT NULL
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cart (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            book_id INTEGER NOT NULL,
+            quantity INTEGER DEFAULT 1,
+            FOREIGN KEY (book_id) REFERENCES books (id) ON DELETE CASCADE,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS favorites (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            book_id INTEGER NOT NULL,
+            UNIQUE(user_id, book_id),
+            FOREIGN KEY (book_id) REFERENCES books (id) ON DELETE CASCADE,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            surname TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            total_cents INTEGER NOT NULL,
+            status TEXT DEFAULT 'Pending',
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS order_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INTEGER NOT NULL,
+            book_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            price_cents INTEGER NOT NULL,
+            FOREIGN KEY (order_id) REFERENCES orders (id) ON DELETE CASCADE,
+            FOREIGN KEY (book_id) REFERENCES books (id) ON DELETE CASCADE
+        )
+    ''')
+
+
+# Prices used to be TEXT like '30.00$'; convert them to integer cents
+def _prices_to_cents(cursor):
+    _migrate_text_price(cursor, 'books', 'price', 'price_cents')
+    _migrate_text_price(cursor, 'orders', 'total_price', 'total_cents')
+    _migrate_text_price(cursor, 'order_items', 'price', 'price_cents')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_books_price ON books (price_cents)")
+
+
+# One cart row per (user, book) so add_to_cart can UPSERT; merge any
+# duplicates left behind by the old check-then-insert code first
+def _unique_cart_rows(cursor):
+    if not _index_exists(cursor, 'idx_cart_user_book'):
+        cursor.execute('''
+            UPDATE cart SET quantity = (
+                SELECT SUM(c2.quantity) FROM cart c2
+                WHERE c2.user_id IS cart.user_id AND c2.book_id = cart.book_id
+            )
+            WHERE id IN (
+                SELECT MIN(id) FROM cart GROUP BY user_id, book_id HAVING COUNT(*) > 1
+            )
+        ''')
+        cursor.execute('''
+            DELETE FROM cart
+            WHERE id NOT IN (SELECT MIN(id) FROM cart GROUP BY user_id, book_id)
+        ''')
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_cart_user_book ON cart (user_id, book_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id)")
+
+
+# Checkout idempotency: a retried or double-submitted order with the
+# same key returns the original order instead of creating a new one
+def _order_idempotency_key(cursor):
+    if 'idempotency_key' not in _columns(cursor, 'orders'):
+        cursor.execute("ALTER TABLE orders ADD COLUMN idempotency_key TEXT")
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_idempotency
+        ON orders (user_id, idempotency_key)
+    ''')
+
+
+# Categories used to be free text on each book. books.category stays as
+# the display label (and for FTS); category_id is what queries use.
+def _categories(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL COLLATE NOCASE,
+            slug TEXT UNIQUE NOT NULL
+        )
+    ''')
+    if 'category_id' not in _columns(cursor, 'books'):
+        cursor.execute("ALTER TABLE books ADD COLUMN category_id INTEGER REFERENCES categories (id)")
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO categories (name, slug)
+            SELECT DISTINCT category, {LEGACY_SLUG_SQL.format(column='category')} FROM books
+        ''')
+        cursor.execute('''
+            UPDATE books SET category_id = (
+                SELECT id FROM categories WHERE categories.name = books.category
+            )
+        ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_books_category ON books (category_id, id)")
+    # No INSERT OR IGNORE here: the conflict clause of an outer statement
+    # (the UPSERT in bookio.py) overrides the one inside a trigger. Dropped
+    # first so databases created with the OR IGNORE version are updated.
+    for event in ('INSERT', 'UPDATE OF category'):
+        name = 'books_category_' + event.split()[0].lower()
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f'''
+            CREATE TRIGGER {name} AFTER {event} ON books BEGIN
+                INSERT INTO categories (name, slug)
+                SELECT NEW.category, {LEGACY_SLUG_SQL.format(column='NEW.category')}
+                WHERE NOT EXISTS (SELECT 1 FROM categories WHERE name = NEW.category);
+                UPDATE books SET category_id = (
+                    SELECT id FROM categories WHERE name = NEW.category
+                )
+                WHERE id = NEW.id;
+            END
+        ''')
+
+
+# Stable external key for bulk imports (see bookio.py); books added
+# by hand may not have one
+def _books_isbn(cursor):
+    if 'isbn' not in _columns(cursor, 'books'):
+        cursor.execute("ALTER TABLE books ADD COLUMN isbn TEXT")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_books_isbn ON books (isbn) WHERE isbn IS NOT NULL")
+
+
+# Catalog version: bumped on every change to books so cached
+# snapshots (see catalog.py) know when to rebuild
+def _catalog_version(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO catalog_meta (id, version) VALUES (1, 0)")
+
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS books_version_{event.lower()}
+            AFTER {event} ON books
+            BEGIN
+                UPDATE catalog_meta SET version = version + 1 WHERE id = 1;
+            END
+        ''')
+
+
+# Full-text index over books (title, category), kept in sync by triggers
+def _books_fts(cursor):
+    fts_exists = _table_exists(cursor, 'books_fts')
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            title, category,
+            content='books', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, category)
+            VALUES (NEW.id, NEW.title, NEW.category);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, category)
+            VALUES ('delete', OLD.id, OLD.title, OLD.category);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, category ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, category)
+            VALUES ('delete', OLD.id, OLD.title, OLD.category);
+            INSERT INTO books_fts (rowid, title, category)
+            VALUES (NEW.id, NEW.title, NEW.category);
+        END
+    ''')
+    if not fts_exists:
+        cursor.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+
+
+# Per-user header counters, maintained by triggers on cart and
+# favorites. The versions let caches (see userstats.py) validate
+# themselves with a single primary-key read.
+def _user_stats(cursor):
+    stats_exists = _table_exists(cursor, 'user_stats')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            cart_count INTEGER NOT NULL DEFAULT 0,
+            favorites_count INTEGER NOT NULL DEFAULT 0,
+            cart_version INTEGER NOT NULL DEFAULT 0,
+            favorites_version INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    if not stats_exists:
+        cursor.execute('''
+            INSERT INTO user_stats (user_id, cart_count, favorites_count)
+            SELECT user_id, SUM(cart_count), SUM(favorites_count)
+            FROM (
+                SELECT user_id, SUM(quantity) AS cart_count, 0 AS favorites_count
+                FROM cart GROUP BY user_id
+                UNION ALL
+                SELECT user_id, 0, COUNT(*) FROM favorites GROUP BY user_id
+            )
+            WHERE user_id IS NOT NULL
+            GROUP BY user_id
+        ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS cart_stats_insert AFTER INSERT ON cart BEGIN
+            INSERT INTO user_stats (user_id, cart_count, cart_version)
+            VALUES (NEW.user_id, NEW.quantity, 1)
+            ON CONFLICT (user_id) DO UPDATE SET
+                cart_count = cart_count + NEW.quantity,
+                cart_version = cart_version + 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS cart_stats_update AFTER UPDATE OF quantity ON cart BEGIN
+            UPDATE user_stats SET
+                cart_count = cart_count - OLD.quantity + NEW.quantity,
+                cart_version = cart_version + 1
+            WHERE user_id = NEW.user_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS cart_stats_delete AFTER DELETE ON cart BEGIN
+            UPDATE user_stats SET
+                cart_count = cart_count - OLD.quantity,
+                cart_version = cart_version + 1
+            WHERE user_id = OLD.user_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS favorites_stats_insert AFTER INSERT ON favorites BEGIN
+            INSERT INTO user_stats (user_id, favorites_count, favorites_version)
+            VALUES (NEW.user_id, 1, 1)
+            ON CONFLICT (user_id) DO UPDATE SET
+                favorites_count = favorites_count + 1,
+                favorites_version = favorites_version + 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS favorites_stats_delete AFTER DELETE ON favorites BEGIN
+            UPDATE user_stats SET
+                favorites_count = favorites_count - 1,
+                favorites_version = favorites_version + 1
+            WHERE user_id = OLD.user_id;
+        END
+    ''')
+
+
+# Change timestamps (unix seconds) for Last-Modified on rendered pages
+def _updated_at(cursor):
+    for table in ('catalog_meta', 'user_stats'):
+        if 'updated_at' not in _columns(cursor, table):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN updated_at INTEGER NOT NULL DEFAULT 0")
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS catalog_meta_touch AFTER UPDATE OF version ON catalog_meta BEGIN
+            UPDATE catalog_meta SET updated_at = CAST(strftime('%s', 'now') AS INTEGER)
+            WHERE id = NEW.id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS user_stats_touch_insert AFTER INSERT ON user_stats BEGIN
+            UPDATE user_stats SET updated_at = CAST(strftime('%s', 'now') AS INTEGER)
+            WHERE user_id = NEW.user_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS user_stats_touch_update
+        AFTER UPDATE OF cart_version, favorites_version ON user_stats BEGIN
+            UPDATE user_stats SET updated_at = CAST(strftime('%s', 'now') AS INTEGER)
+            WHERE user_id = NEW.user_id;
+        END
+    ''')
+
+
+# Starter catalog for an empty database
+def _default_books(cursor):
+    cursor.execute("SELECT COUNT(*) FROM books")
+    if cursor.fetchone()[0] == 0:
+        default_books = [
+            ("Desgin Patterns", "desginPetterns.jpeg", 3000, "Programming General"),
+            ("Clean Code", "clean-code.jpeg", 2500, "Programming General"),
+            ("Python Crash Course", "python-crash.jpeg", 2000, "Programming General"),
+            ("The Pragmatic Programmer", "pragmatic.jpeg", 1500, "Programming General"),
+            ("Operating Systems-Three pieces", "operating-systems.jpeg", 2000, "Interaction with hardware"),
+            ("Computer Architecture", "computer-arch.jpeg", 1700, "Interaction with hardware"),
+            ("Low-Level Programming", "low.jpeg", 2200, "Interaction with hardware"),
+            ("Linux-Kernel Development", "kernel.jpeg", 1900, "Interaction with hardware"),
+            ("Black-Hat Python", "black-hat.jpeg", 2300, "Secure Systmes"),
+            ("Metasploit", "metasploit.jpeg", 3100, "Secure Systmes"),
+            ("Social Eengineering", "social.jpeg", 1500, "Secure Systmes"),
+            ("Networking Top-Down Approach", "net.jpeg", 1900, "Secure Systmes"),
+        ]
+
+        cursor.executemany('''
+            INSERT INTO books (title, img, price_cents, category)
+            VALUES (?, ?, ?, ?)
+        ''', default_books)
+
+
+# Sales rollups maintained by place_order() (see sales.py), built here from
+# any orders that already exist, and the index behind order history
+def _sales_rollups(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_user ON orders (user_id, id)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sales_daily_books (
+            day TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            revenue_cents INTEGER NOT NULL,
+            order_count INTEGER NOT NULL,
+            PRIMARY KEY (day, book_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sales_daily_categories (
+            day TEXT NOT NULL,
+            category_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            revenue_cents INTEGER NOT NULL,
+            order_count INTEGER NOT NULL,
+            PRIMARY KEY (day, category_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sales_books (
+            book_id INTEGER PRIMARY KEY,
+            quantity INTEGER NOT NULL,
+            revenue_cents INTEGER NOT NULL,
+            order_count INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_books_rank ON sales_books (quantity DESC, book_id)")
+
+    cursor.execute('''
+        INSERT INTO sales_daily_books (day, book_id, quantity, revenue_cents, order_count)
+        SELECT date(o.order_date), i.book_id, SUM(i.quantity), SUM(i.quantity * i.price_cents), COUNT(DISTINCT o.id)
+        FROM orders o JOIN order_items i ON i.order_id = o.id
+        GROUP BY date(o.order_date), i.book_id
+    ''')
+    cursor.execute('''
+        INSERT INTO sales_daily_categories (day, category_id, quantity, revenue_cents, order_count)
+        SELECT date(o.order_date), b.category_id, SUM(i.quantity), SUM(i.quantity * i.price_cents), COUNT(DISTINCT o.id)
+        FROM orders o JOIN order_items i ON i.order_id = o.id JOIN books b ON b.id = i.book_id
+        WHERE b.category_id IS NOT NULL
+        GROUP BY date(o.order_date), b.category_id
+    ''')
+    cursor.execute('''
+        INSERT INTO sales_books (book_id, quantity, revenue_cents, order_count)
+        SELECT i.book_id, SUM(i.quantity), SUM(i.quantity * i.price_cents), COUNT(DISTINCT o.id)
+        FROM order_items i JOIN orders o ON o.id = i.order_id
+        GROUP BY i.book_id
+    ''')
+
+
+# Category slugs used to be the lowercased name with spaces dashed: they
+# could keep '/', '#' or '?', and a new category whose slug matched an
+# existing one failed the book write on the UNIQUE constraint
+def _category_slugs(cursor):
+    for event in ('INSERT', 'UPDATE OF category'):
+        name = 'books_category_' + event.split()[0].lower()
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f'''
+            CREATE TRIGGER {name} AFTER {event} ON books BEGIN
+                INSERT INTO categories (name, slug)
+                SELECT NEW.category, '~' || lower(hex(randomblob(16)))
+                WHERE NOT EXISTS (SELECT 1 FROM categories WHERE name = NEW.category);
+                {assign_slug_sql('NEW.category', "name = NEW.category AND slug GLOB '~*'")};
+                UPDATE books SET category_id = (
+                    SELECT id FROM categories WHERE name = NEW.category
+                )
+                WHERE id = NEW.id;
+            END
+        ''')
+
+    # Re-slug categories whose slug does not fit in a URL or holds the '--'
+    # the suffix relies on, and add the ones the first backfill skipped on a
+    # slug collision. One row at a time, so each collision check sees the
+    # slugs assigned before it.
+    cursor.execute("UPDATE categories SET slug = '~' || id WHERE slug = '' OR slug GLOB '*[^a-z0-9-]*' OR slug GLOB '*--*'")
+    cursor.execute('''
+        INSERT INTO categories (name, slug)
+        SELECT DISTINCT category, '~' || lower(hex(randomblob(16))) FROM books
+        WHERE category_id IS NULL AND NOT EXISTS (SELECT 1 FROM categories WHERE name = books.category)
+    ''')
+    for category_id, name in cursor.execute("SELECT id, name FROM categories WHERE slug GLOB '~*'").fetchall():
+        cursor.execute(assign_slug_sql(':name', 'id = :id'), {'name': name, 'id': category_id})
+    cursor.execute('''
+        UPDATE books SET category_id = (
+            SELECT id FROM categories WHERE categories.name = books.category
+        )
+        WHERE category_id IS NULL
+    ''')
+
+
+# A row in bulk_import switches off the per-row search index and catalog
+# version triggers. bookio.py sets it inside each chunk transaction and
+# clears it before commit, so other connections never see it set.
+def _bulk_import_flag(cursor):
+    cursor.execute("CREATE TABLE IF NOT EXISTS bulk_import (id INTEGER PRIMARY KEY CHECK (id = 1))")
+    for name in ('books_fts_insert', 'books_fts_update', 'books_version_insert', 'books_version_update'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+    cursor.execute('''
+        CREATE TRIGGER books_fts_insert AFTER INSERT ON books
+        WHEN NOT EXISTS (SELECT 1 FROM bulk_import) BEGIN
+            INSERT INTO books_fts (rowid, title, category)
+            VALUES (NEW.id, NEW.title, NEW.category);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER books_fts_update AFTER UPDATE OF title, category ON books
+        WHEN NOT EXISTS (SELECT 1 FROM bulk_import) BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, category)
+            VALUES ('delete', OLD.id, OLD.title, OLD.category);
+            INSERT INTO books_fts (rowid, title, category)
+            VALUES (NEW.id, NEW.title, NEW.category);
+        END
+    ''')
+    for event in ('INSERT', 'UPDATE'):
+        cursor.execute(f'''
+            CREATE TRIGGER books_version_{event.lower()} AFTER {event} ON books
+            WHEN NOT EXISTS (SELECT 1 FROM bulk_import) BEGIN
+                UPDATE catalog_meta SET version = version + 1 WHERE id = 1;
+            END
+        ''')
+
+
+# idx_cart_user_book_qty (user_id, book_id, quantity) duplicated the unique
+# idx_cart_user_book, so every cart write kept two near-identical B-trees
+def _drop_cart_qty_index(cursor):
+    cursor.execute("DROP INDEX IF EXISTS idx_cart_user_book_qty")
+
+
+# Databases that already ran _category_slugs kept legacy slugs such as
+# 'web--dev' (a name with two spaces), which a '--<id>' suffix could collide
+# with. Every slug that isn't its name's slug, alone or with its own
+# '--<id>', goes through assign_slug_sql again.
+def _normalize_category_slugs(cursor):
+    stale = []
+    for category_id, name, slug in cursor.execute("SELECT id, name, slug FROM categories").fetchall():
+        base = cursor.execute(f"SELECT {category_slug_sql(':name')}", {'name': name}).fetchone()[0]
+        if slug not in (base, f"{base}--{category_id}"):
+            stale.append((category_id, name))
+    cursor.executemany("UPDATE categories SET slug = '~' || id WHERE id = ?", [(i,) for i, _ in stale])
+    for category_id, name in stale:
+        cursor.execute(assign_slug_sql(':name', 'id = :id'), {'name': name, 'id': category_id})
+
+
+MIGRATIONS = (
+    _create_tables,
+    _prices_to_cents,
+    _unique_cart_rows,
+    _order_idempotency_key,
+    _categories,
+    _books_isbn,
+    _catalog_version,
+    _books_fts,
+    _user_stats,
+    _updated_at,
+    _default_books,
+    _sales_rollups,
+    _category_slugs,
+    _bulk_import_flag,
+    _drop_cart_qty_index,
+    _normalize_category_slugs,
+)
+LATEST_VERSION = len(MIGRATIONS)
+
+
+def schema_version(db):
+    return db.execute("PRAGMA user_version").fetchone()[0]
+
+
+def upgrade(db):
+    """Apply the pending steps; returns the names of the ones applied."""
+    applied = []
+    if schema_version(db) >= LATEST_VERSION:
+        return applied
+    while True:
+        with write_transaction(db):
+            # Re-read under the write lock; another process may have got here first
+            version = schema_version(db)
+            if version >= LATEST_VERSION:
+                return applied
+            step = MIGRATIONS[version]
+            step(db.cursor())
+            db.execute(f"PRAGMA user_version = {version + 1}")
+        applied.append(step.__name__.lstrip('_'))
+
+
+# === CLI ===
+@bp.cli.command('upgrade')
+def upgrade_command():
+    """Bring the database schema up to date."""
+    try:
+        applied = upgrade(get_database())
+    except MigrationError as e:
+        raise click.ClickException(str(e))
+    for name in applied:
+        click.echo(f"applied {name}")
+    click.echo(f"schema at version {LATEST_VERSION}" + ("" if applied else " (already current)"))
+
+
+@bp.cli.command('version')
+def version_command():
+    """Show the database schema version."""
+    click.echo(f"{schema_version(get_database())} of {LATEST_VERSION}")
+
+
+# Checked before requests rather than at import, so `flask db upgrade` itself
+# can still load the app; once the schema is current it is never read again
+_current_apps = set()
+
+
+def _require_current_schema():
+    app = current_app._get_current_object()
+    if app in _current_apps:
+        return None
+    version = schema_version(get_database())
+    if version >= LATEST_VERSION:
+        _current_apps.add(app)
+        return None
+    logger.error("database schema is at version %d of %d; run `flask db upgrade`", version, LATEST_VERSION)
+    return f"Databaza nuk është e përditësuar (versioni {version} nga {LATEST_VERSION}).", 503
+
+
+def init_app(app):
+    app.register_blueprint(bp)
+    app.before_request(_require_current_schema)
@@ -0,0 +1,25 @@
+# money.py
+# Prices are stored as integer cents; they only become strings at render time.
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+CURRENCY_SYMBOL = '$'
+
+
+def format_price(cents):
+    if cents is None:
+        cents = 0
+    sign = '-' if cents < 0 else ''
+    cents = abs(int(cents))
+    return f"{sign}{cents // 100}.{cents % 100:02d}{CURRENCY_SYMBOL}"
+
+
+# '30', '30.5', '30.00$' or '30,00' -> 3000; raises ValueError for anything else
+def parse_price(text):
+    text = str(text).strip().replace(CURRENCY_SYMBOL, '').replace(',', '.')
+    try:
+        value = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"invalid price: {text!r}")
+    if not value.is_finite() or value < 0:
+        raise ValueError(f"invalid price: {text!r}")
+    return int((value * 100).quantize(Decimal(1), ROUND_HALF_UP))
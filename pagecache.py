@@ -0,0 +1,68 @@
+# pagecache.py
+# Conditional GET for rendered pages. A page's ETag is derived from the
+# versions that feed it (catalog version, per-user cart/favorites versions)
+# plus a build id, so an unchanged page is answered with 304 before any
+# template is rendered. Last-Modified is the newer of the data's updated_at
+# and the build time, which every worker derives from the same files.
+import hashlib
+import os
+import threading
+from datetime import datetime, timezone
+
+from flask import current_app, request, make_response
+
+from assets import get_manifest
+
+_builds = {}
+_lock = threading.Lock()
+
+
+# (build id, build time). The id changes whenever templates or static assets
+# change, so a deploy never serves a 304 for markup rendered by the previous
+# release; the time is the newest modification time among those files
+def _build():
+    app = current_app._get_current_object()
+    value = _builds.get(app)
+    if value is None:
+        with _lock:
+            digest = hashlib.sha1()
+            built_at = 0
+            template_folder = os.path.join(app.root_path, app.template_folder)
+            for name in sorted(app.jinja_env.list_templates()):
+                path = os.path.join(template_folder, name)
+                with open(path, 'rb') as f:
+                    digest.update(name.encode() + b'\0' + f.read())
+                built_at = max(built_at, os.path.getmtime(path))
+            manifest = get_manifest()
+            for logical, hashed in sorted(manifest.urls.items()):
+                digest.update(f"{logical}={hashed}".encode())
+                built_at = max(built_at, os.path.getmtime(
+                    os.path.join(app.static_folder, manifest.entries[hashed]['path'])))
+            value = _builds[app] = (digest.hexdigest()[:16], int(built_at))
+    return value
+
+
+def conditional_page(key, updated_at, render):
+    build, built_at = _build()
+    etag = hashlib.sha1(repr((build, key)).encode()).hexdigest()
+    last_modified = datetime.fromtimestamp(max(updated_at, built_at), timezone.utc)
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    elif request.if_modified_since:
+        not_modified = last_modified <= request.if_modified_since
+    else:
+        not_modified = False
+
+    if not_modified:
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(render())
+
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Pages depend on the session cookie; browsers may keep them but must revalidate
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
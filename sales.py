@@ -0,0 +1,195 @@
+# sales.py
+# Sales rollups: quantity and revenue per book and per category by day, and
+# all-time per book. place_order() folds each new order in inside the
+# checkout transaction, so reports read a handful of precomputed rows instead
+# of scanning order_items. `flask sales backfill` rebuilds them from orders
+# into temp tables and swaps them in with one transaction, so reports never
+# see the rollups empty or half rebuilt.
+import click
+from flask import Blueprint
+
+from database import get_database, write_transaction
+
+DEFAULT_HISTORY_LIMIT = 20
+MAX_HISTORY_LIMIT = 100
+DEFAULT_REPORT_LIMIT = 10
+MAX_REPORT_LIMIT = 100
+BACKFILL_CHUNK = 5000    # orders folded per backfill step
+
+# Rollup table -> the key its rows are upserted on
+ROLLUP_TABLES = {
+    'sales_daily_books': 'day, book_id',
+    'sales_daily_categories': 'day, category_id',
+    'sales_books': 'book_id',
+}
+
+bp = Blueprint('sales', __name__, cli_group='sales')
+
+# Each statement adds the items of the orders with id in (?, ?] to one
+# rollup; {prefix} points them at the backfill's temp copies instead
+_FOLD_SQL = (
+    """
+    INSERT INTO {prefix}sales_daily_books (day, book_id, quantity, revenue_cents, order_count)
+    SELECT date(o.order_date), i.book_id, SUM(i.quantity), SUM(i.quantity * i.price_cents), COUNT(DISTINCT o.id)
+    FROM orders o JOIN order_items i ON i.order_id = o.id
+    WHERE o.id > ? AND o.id <= ?
+    GROUP BY date(o.order_date), i.book_id
+    ON CONFLICT (day, book_id) DO UPDATE SET
+        quantity = quantity + excluded.quantity,
+        revenue_cents = revenue_cents + excluded.revenue_cents,
+        order_count = order_count + excluded.order_count
+    """,
+    """
+    INSERT INTO {prefix}sales_daily_categories (day, category_id, quantity, revenue_cents, order_count)
+    SELECT date(o.order_date), b.category_id, SUM(i.quantity), SUM(i.quantity * i.price_cents), COUNT(DISTINCT o.id)
+    FROM orders o JOIN order_items i ON i.order_id = o.id JOIN books b ON b.id = i.book_id
+    WHERE o.id > ? AND o.id <= ? AND b.category_id IS NOT NULL
+    GROUP BY date(o.order_date), b.category_id
+    ON CONFLICT (day, category_id) DO UPDATE SET
+        quantity = quantity + excluded.quantity,
+        revenue_cents = revenue_cents + excluded.revenue_cents,
+        order_count = order_count + excluded.order_count
+    """,
+    """
+    INSERT INTO {prefix}sales_books (book_id, quantity, revenue_cents, order_count)
+    SELECT i.book_id, SUM(i.quantity), SUM(i.quantity * i.price_cents), COUNT(DISTINCT o.id)
+    FROM orders o JOIN order_items i ON i.order_id = o.id
+    WHERE o.id > ? AND o.id <= ?
+    GROUP BY i.book_id
+    ON CONFLICT (book_id) DO UPDATE SET
+        quantity = quantity + excluded.quantity,
+        revenue_cents = revenue_cents + excluded.revenue_cents,
+        order_count = order_count + excluded.order_count
+    """,
+)
+
+
+def fold_orders(db, after, upto, prefix=''):
+    for sql in _FOLD_SQL:
+        db.execute(sql.format(prefix=prefix), (after, upto))
+
+
+# Called by place_order() in its transaction, after the order items exist
+def record_order(db, order_id):
+    fold_orders(db, order_id - 1, order_id)
+
+
+def backfill(db, chunk_size=BACKFILL_CHUNK, progress=None):
+    # Empty copies of the rollups in the connection's temp schema; filling
+    # them doesn't take the database write lock
+    for table, key in ROLLUP_TABLES.items():
+        db.execute(f"DROP TABLE IF EXISTS temp.backfill_{table}")
+        db.execute(f"CREATE TEMP TABLE backfill_{table} AS SELECT * FROM {table} WHERE false")
+        db.execute(f"CREATE UNIQUE INDEX temp.backfill_{table}_key ON backfill_{table} ({key})")
+
+    last_id = db.execute("SELECT IFNULL(MAX(id), 0) FROM orders").fetchone()[0]
+    after = 0
+    while after < last_id:
+        upto = min(after + chunk_size, last_id)
+        with db:
+            fold_orders(db, after, upto, 'temp.backfill_')
+        after = upto
+        if progress:
+            progress(after, last_id)
+
+    # Fold in the orders placed meanwhile and swap, all under the write lock
+    # so no checkout lands in between
+    with write_transaction(db):
+        last_id = db.execute("SELECT IFNULL(MAX(id), 0) FROM orders").fetchone()[0]
+        fold_orders(db, after, last_id, 'temp.backfill_')
+        for table in ROLLUP_TABLES:
+            db.execute(f"DELETE FROM {table}")
+            db.execute(f"INSERT INTO {table} SELECT * FROM temp.backfill_{table}")
+    for table in ROLLUP_TABLES:
+        db.execute(f"DROP TABLE temp.backfill_{table}")
+    return last_id
+
+
+# === READS ===
+def order_history(db, user_id, before=None, limit=DEFAULT_HISTORY_LIMIT):
+    # Newest first, keyset on idx_orders_user (user_id, id); one extra row
+    # tells whether there is more
+    orders = db.execute("""
+        SELECT id, order_date, total_cents, status
+        FROM orders
+        WHERE user_id = ? AND id < ?
+        ORDER BY id DESC
+        LIMIT ?
+    """, (user_id, before or (1 << 62), limit + 1)).fetchall()
+
+    next_before = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_before = orders[-1]['id']
+
+    items = {}
+    if orders:
+        rows = db.execute(f"""
+            SELECT i.order_id, i.book_id, i.quantity, i.price_cents, b.title, b.img
+            FROM order_items i
+            JOIN books b ON b.id = i.book_id
+            WHERE i.order_id IN ({', '.join('?' * len(orders))})
+            ORDER BY i.order_id, i.id
+        """, [order['id'] for order in orders]).fetchall()
+        for row in rows:
+            items.setdefault(row['order_id'], []).append(row)
+    return [(order, items.get(order['id'], [])) for order in orders], next_before
+
+
+def best_sellers(db, limit=DEFAULT_REPORT_LIMIT, days=None):
+    if days is None:
+        # All time: read straight off idx_sales_books_rank
+        return db.execute("""
+            SELECT b.id, b.title, b.img, b.price_cents, b.category,
+                   s.quantity, s.revenue_cents, s.order_count
+            FROM sales_books s
+            JOIN books b ON b.id = s.book_id
+            ORDER BY s.quantity DESC, s.book_id
+            LIMIT ?
+        """, (limit,)).fetchall()
+
+    return db.execute("""
+        SELECT b.id, b.title, b.img, b.price_cents, b.category,
+               s.quantity, s.revenue_cents, s.order_count
+        FROM (
+            SELECT book_id, SUM(quantity) AS quantity, SUM(revenue_cents) AS revenue_cents,
+                   SUM(order_count) AS order_count
+            FROM sales_daily_books
+            WHERE day > date('now', ?)
+            GROUP BY book_id
+        ) s
+        JOIN books b ON b.id = s.book_id
+        ORDER BY s.quantity DESC, s.book_id
+        LIMIT ?
+    """, (f"-{days} days", limit)).fetchall()
+
+
+def category_revenue(db, days=None):
+    where, params = '', ()
+    if days is not None:
+        where, params = "WHERE s.day > date('now', ?)", (f"-{days} days",)
+    return db.execute(f"""
+        SELECT c.name, c.slug, SUM(s.quantity) AS quantity,
+               SUM(s.revenue_cents) AS revenue_cents, SUM(s.order_count) AS order_count
+        FROM sales_daily_categories s
+        JOIN categories c ON c.id = s.category_id
+        {where}
+        GROUP BY s.category_id
+        ORDER BY revenue_cents DESC, c.name
+    """, params).fetchall()
+
+
+# === CLI ===
+@bp.cli.command('backfill')
+@click.option('--chunk-size', default=BACKFILL_CHUNK, show_default=True, help="Orders folded per step.")
+def backfill_command(chunk_size):
+    """Rebuild the sales rollups from every order."""
+    def progress(done, total):
+        click.echo(f"{done:,} / {total:,} orders", err=True)
+
+    last_id = backfill(get_database(), chunk_size, progress)
+    click.echo(f"sales rollups rebuilt up to order {last_id}")
+
+
+def init_app(app):
+    app.register_blueprint(bp)
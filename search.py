@@ -0,0 +1,69 @@
+# search.py
+import base64
+import json
+import re
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def build_match_query(query):
+    # Every word becomes a quoted prefix term, so "pyth cra" matches
+    # "Python Crash Course" and FTS5 syntax in user input is never parsed
+    tokens = _TOKEN.findall(query.lower())
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def encode_cursor(score, book_id):
+    raw = json.dumps([score, book_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        score, book_id = json.loads(base64.urlsafe_b64decode(padded))
+        return float(score), int(book_id)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+
+
+def search_books(db, query, limit=DEFAULT_LIMIT, cursor=None):
+    match = build_match_query(query)
+    if not match:
+        return [], None
+
+    limit = max(1, min(limit, MAX_LIMIT))
+    params = [match]
+    after = ''
+    if cursor:
+        params.extend(decode_cursor(cursor))
+        after = 'WHERE (s.score, s.id) > (?, ?)'
+    params.append(limit + 1)
+
+    # bm25 is lower-is-better; title matches weigh more than category matches.
+    # Keyset pagination on (score, id) keeps deep pages as cheap as the first.
+    rows = db.execute(f"""
+        SELECT b.id, b.title, b.img, b.price_cents, b.category, s.score
+        FROM (
+            SELECT rowid AS id, bm25(books_fts, 10.0, 1.0) AS score
+            FROM books_fts
+            WHERE books_fts MATCH ?
+        ) s
+        JOIN books b ON b.id = s.id
+        {after}
+        ORDER BY s.score, s.id
+        LIMIT ?
+    """, params).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['score'], rows[-1]['id'])
+    return rows, next_cursor
@@ -0,0 +1,53 @@
+# userstats.py
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+# Upper bound on users whose favorite sets are kept in memory per process
+FAVORITES_CACHE_SIZE = 10000
+
+
+class UserStats(NamedTuple):
+    cart_count: int = 0
+    favorites_count: int = 0
+    cart_version: int = 0
+    favorites_version: int = 0
+    updated_at: int = 0
+
+
+_favorites = OrderedDict()   # user_id -> (favorites_version, frozenset of book ids)
+_lock = threading.Lock()
+
+
+def get_user_stats(db, user_id):
+    row = db.execute("""
+        SELECT cart_count, favorites_count, cart_version, favorites_version, updated_at
+        FROM user_stats
+        WHERE user_id = ?
+    """, (user_id,)).fetchone()
+    return UserStats(*row) if row else UserStats()
+
+
+# Cached per user and validated against favorites_version, so writes from
+# other processes are picked up without a TTL
+def get_favorite_ids(db, user_id, version):
+    with _lock:
+        cached = _favorites.get(user_id)
+        if cached is not None and cached[0] == version:
+            _favorites.move_to_end(user_id)
+            return cached[1]
+
+    rows = db.execute("SELECT book_id FROM favorites WHERE user_id = ?", (user_id,))
+    ids = frozenset(row[0] for row in rows)
+
+    with _lock:
+        _favorites[user_id] = (version, ids)
+        _favorites.move_to_end(user_id)
+        while len(_favorites) > FAVORITES_CACHE_SIZE:
+            _favorites.popitem(last=False)
+    return ids
+
+
+def invalidate_favorites(user_id):
+    with _lock:
+        _favorites.pop(user_id, None)